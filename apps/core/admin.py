@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Profile, Stock, StockHistory
+from .models import PriceAlert, Profile, Stock, StockHistory, SyncRun
 
 class ProfileInline(admin.StackedInline):
     model = Profile
@@ -40,4 +40,43 @@ class StockAdmin(admin.ModelAdmin):
 class StockHistoryAdmin(admin.ModelAdmin):
     list_display = ('stock', 'price', 'date')
     list_filter = ('stock', 'date')
-    date_hierarchy = 'date'
\ No newline at end of file
+    date_hierarchy = 'date'
+
+@admin.register(PriceAlert)
+class PriceAlertAdmin(admin.ModelAdmin):
+    list_display = ('stock', 'user', 'threshold', 'is_active', 'triggered_at', 'triggered_price', 'notified_at')
+    list_filter = ('is_active', 'triggered_at')
+    search_fields = ('stock__symbol', 'user__email')
+    raw_id_fields = ('user', 'stock')
+    readonly_fields = ('triggered_at', 'triggered_price', 'notified_at')
+
+@admin.register(SyncRun)
+class SyncRunAdmin(admin.ModelAdmin):
+    list_display = ('job', 'trigger', 'status', 'started_at', 'duration_ms', 'rows_read',
+                    'rows_written', 'rows_skipped', 'api_calls', 'retries', 'error_count')
+    list_filter = ('job', 'status', 'trigger', 'started_at')
+    date_hierarchy = 'started_at'
+    change_list_template = 'admin/core/syncrun/change_list.html'
+    
+    # Runs are written by the jobs themselves
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        """Add throughput and latency series for the filtered runs"""
+        response = super().changelist_view(request, extra_context)
+        if not hasattr(response, 'context_data') or 'cl' not in response.context_data:
+            return response
+        
+        runs = response.context_data['cl'].queryset.order_by('-started_at')[:200]
+        series = {}
+        for run in reversed(runs):
+            points = series.setdefault(run.get_job_display(), {'throughput': [], 'latency': []})
+            timestamp = run.started_at.isoformat()
+            points['throughput'].append({'x': timestamp, 'y': round(run.rows_per_second, 1)})
+            points['latency'].append({'x': timestamp, 'y': run.duration_ms})
+        response.context_data['sync_chart_series'] = series
+        return response
@@ -1,5 +1,27 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     name = 'apps.core'
+    
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals  # registers the counter receivers
+        from .utils.db import configure_sqlite_connection
+        from .utils.query_budget import install_query_recording
+        
+        connection_created.connect(configure_sqlite_connection)
+        connection_created.connect(install_query_recording)
+        post_migrate.connect(ensure_search_index, sender=self)
+
+
+def ensure_search_index(using, **kwargs):
+    """Restore the stock search triggers if a table rebuild dropped them"""
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .utils.stock_search import install_search_index
+    
+    connection = connections[using]
+    if MigrationRecorder(connection).migration_qs.filter(app='core', name='0007_stock_search_index').exists():
+        install_search_index(connection)
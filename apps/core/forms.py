@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from .models import PriceAlert
 
 class CustomUserCreationForm(UserCreationForm):
     email = forms.EmailField(
@@ -37,4 +38,18 @@ class CustomUserCreationForm(UserCreationForm):
         
         if commit:
             user.save()
-        return user
\ No newline at end of file
+        return user
+
+class PriceAlertForm(forms.ModelForm):
+    class Meta:
+        model = PriceAlert
+        fields = ('threshold',)
+        widgets = {
+            'threshold': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '0.01', 'placeholder': '0.00'}),
+        }
+    
+    def clean_threshold(self):
+        threshold = self.cleaned_data['threshold']
+        if threshold <= 0:
+            raise forms.ValidationError('The price must be above zero.')
+        return threshold
@@ -0,0 +1,211 @@
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import NoReverseMatch, URLPattern, URLResolver, get_resolver, resolve, reverse
+from apps.core.models import PriceAlert, Profile, Stock
+from apps.core.utils.query_budget import QueryRecorder, get_query_budget
+from apps.payments.models import Deposit, Invoice
+from apps.portfolio.models import ChartView, Holding, Lot, Portfolio, Trade
+
+# Rows per relation; enough for an N+1 to show up as a repeated query shape
+FIXTURE_ROWS = 5
+
+# URL kwargs for each app route, resolved against the fixture objects
+URL_KWARGS = {
+    'core:stock_detail': lambda f: {'symbol': f['stock'].symbol},
+    'core:add_price_alert': lambda f: {'symbol': f['stock'].symbol},
+    'core:delete_price_alert': lambda f: {'pk': f['price_alert'].pk},
+    'payments:deposit_detail': lambda f: {'pk': f['deposit'].pk},
+    'payments:download_invoice': lambda f: {'pk': f['deposit'].pk},
+    'payments:sync_to_sheets': lambda f: {'pk': f['deposit'].pk},
+    'portfolio:detail': lambda f: {'pk': f['portfolio'].pk},
+    'portfolio:update': lambda f: {'pk': f['portfolio'].pk},
+    'portfolio:add_holding': lambda f: {'pk': f['portfolio'].pk},
+    'portfolio:holding_trades': lambda f: {'pk': f['holding'].pk},
+    'portfolio:delete_holding': lambda f: {'pk': f['holding'].pk},
+    'portfolio:stock_chart': lambda f: {'stock_id': f['stock'].pk},
+}
+
+# Form data each route accepting POST is submitted with. Every POST runs in
+# its own rolled-back savepoint, so deletes and trades leave the fixtures intact.
+URL_POST_DATA = {
+    'core:profile': lambda f: {'first_name': 'Query', 'last_name': 'Budget', 'phone': '', 'company': '', 'address': ''},
+    'core:add_price_alert': lambda f: {'threshold': '150.00'},
+    'core:delete_price_alert': lambda f: {},
+    'payments:deposit_create': lambda f: {
+        'portfolio': f['portfolio'].pk, 'stock': f['stock'].pk, 'amount': '250.00', 'payment_method': 'bank_transfer',
+    },
+    'payments:sync_to_sheets': lambda f: {},
+    'portfolio:create': lambda f: {'name': 'Budget Portfolio New', 'description': ''},
+    'portfolio:update': lambda f: {'name': 'Budget Portfolio Renamed', 'description': 'Updated'},
+    'portfolio:add_holding': lambda f: {'stock_id': f['stock'].pk, 'quantity': '2', 'price': '101.00'},
+    'portfolio:holding_trades': lambda f: {'side': 'buy', 'quantity': '2', 'price': '101.00'},
+    'portfolio:delete_holding': lambda f: {},
+}
+
+BUDGET_CHECK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'check-query-budgets',
+    }
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def app_url_names():
+    """Namespaced names of every route declared in apps/*/urls.py"""
+    names = []
+    for entry in get_resolver().url_patterns:
+        if isinstance(entry, URLResolver) and getattr(entry.urlconf_module, '__name__', '').startswith('apps.'):
+            for pattern in entry.url_patterns:
+                if isinstance(pattern, URLPattern) and pattern.name:
+                    names.append(f'{entry.namespace}:{pattern.name}')
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Request every app URL against fixture data and fail on query budget overruns or N+1 patterns'
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            # A private cache: budgets are measured cold, and nothing computed
+            # from the rolled-back fixtures leaks into the real cache
+            with override_settings(CACHES=BUDGET_CHECK_CACHES), transaction.atomic():
+                fixtures = self.create_fixtures()
+                client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+                client.force_login(fixtures['user'])
+                for name in app_url_names():
+                    for method in self.methods(name, fixtures):
+                        results.append(self.check_url(client, name, method, fixtures))
+                raise Rollback
+        except Rollback:
+            pass
+
+        failures = [label for label, ok in results if not ok]
+        if failures:
+            raise CommandError(f'{len(failures)} requests failed their query budget check: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} requests are within their query budgets'))
+
+    def methods(self, name, fixtures):
+        """GET unless the view only handles POST, then POST for routes with URL_POST_DATA"""
+        if name not in URL_POST_DATA:
+            return ['GET']
+        try:
+            view_class = getattr(resolve(self._url(name, fixtures)).func, 'view_class', None)
+        except NoReverseMatch:
+            # check_url reports the missing kwargs
+            return ['GET']
+        if view_class is None or hasattr(view_class, 'get'):
+            return ['GET', 'POST']
+        return ['POST']
+
+    def check_url(self, client, name, method, fixtures):
+        label = name if method == 'GET' else f'{name} ({method})'
+        budgets = 'QUERY_BUDGETS' if method == 'GET' else 'QUERY_BUDGETS_POST'
+        budget = get_query_budget(name, method)
+        if budget is None or name not in getattr(settings, budgets):
+            self.stdout.write(self.style.ERROR(f'✗ {label}: no budget declared in {budgets}'))
+            return label, False
+        if name not in URL_KWARGS and self._needs_kwargs(name):
+            self.stdout.write(self.style.ERROR(f'✗ {label}: no fixture kwargs in URL_KWARGS'))
+            return label, False
+
+        url = self._url(name, fixtures)
+        try:
+            if method == 'POST':
+                data = URL_POST_DATA[name](fixtures)
+                with transaction.atomic():
+                    with QueryRecorder() as recorder:
+                        response = client.post(url, data, secure=not settings.DEBUG)
+                    transaction.set_rollback(True)
+            else:
+                with QueryRecorder() as recorder:
+                    response = client.get(url, secure=not settings.DEBUG)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'✗ {label}: request failed: {e}'))
+            return label, False
+
+        # A 405 measured nothing the route actually does
+        if response.status_code == 405:
+            self.stdout.write(self.style.ERROR(f'✗ {label} [405]: method not allowed; add it to URL_POST_DATA'))
+            return label, False
+        problems = recorder.problems(budget)
+        if problems:
+            self.stdout.write(self.style.ERROR(f'✗ {label} [{response.status_code}]: ' + '; '.join(problems)))
+            return label, False
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {label} [{response.status_code}]: {recorder.count}/{budget} queries'
+        ))
+        return label, True
+
+    def _url(self, name, fixtures):
+        return reverse(name, kwargs=URL_KWARGS[name](fixtures) if name in URL_KWARGS else {})
+
+    def _needs_kwargs(self, name):
+        try:
+            reverse(name)
+            return False
+        except NoReverseMatch:
+            return True
+
+    def create_fixtures(self):
+        """A user with several portfolios, holdings, trades, deposits, invoices, chart views and price alerts"""
+        user = User.objects.create_user(
+            username='query-budget-check', email='query-budget@example.com', password=None
+        )
+        Profile.objects.create(user=user)
+        stocks = Stock.objects.bulk_create([
+            Stock(symbol=f'QB{i}', name=f'Budget Stock {i}', current_price=Decimal('100') + i)
+            for i in range(FIXTURE_ROWS)
+        ])
+        portfolios = Portfolio.objects.bulk_create([
+            Portfolio(user=user, name=f'Budget Portfolio {i}') for i in range(FIXTURE_ROWS)
+        ])
+        holdings = Holding.objects.bulk_create([
+            Holding(portfolio=portfolio, stock=stock, quantity=Decimal('1'), average_buy_price=Decimal('90'),
+                    cost_basis=Decimal('90'))
+            for portfolio in portfolios
+            for stock in stocks
+        ])
+        trades = Trade.objects.bulk_create([
+            Trade(holding=holdings[0], side='buy', quantity=Decimal('1'), price=Decimal('90') + i)
+            for i in range(FIXTURE_ROWS)
+        ])
+        Lot.objects.bulk_create([
+            Lot(holding=holdings[0], trade=trade, quantity=trade.quantity, remaining=trade.quantity,
+                price=trade.price, acquired_at=trade.executed_at)
+            for trade in trades
+        ])
+        # bulk_create skips Deposit.save(), so no invoice PDFs are rendered. The
+        # first deposit stays pending so the invoice download does not render one.
+        deposits = Deposit.objects.bulk_create([
+            Deposit(
+                user=user, portfolio=portfolios[i], stock=stocks[i], amount=Decimal('100'),
+                payment_method='bank_transfer', status='completed' if i else 'pending',
+                invoice_number=f'QB-INV-{i}',
+            )
+            for i in range(FIXTURE_ROWS)
+        ])
+        Invoice.objects.bulk_create([
+            Invoice(deposit=deposit, pdf_file=f'invoices/{deposit.invoice_number}.pdf')
+            for deposit in deposits
+        ])
+        ChartView.objects.bulk_create([ChartView(user=user, stock=stock) for stock in stocks])
+        price_alerts = PriceAlert.objects.bulk_create([
+            PriceAlert(user=user, stock=stocks[0], threshold=Decimal('100') + i) for i in range(FIXTURE_ROWS)
+        ])
+        return {
+            'user': user,
+            'stock': stocks[0],
+            'portfolio': portfolios[0],
+            'holding': holdings[0],
+            'deposit': deposits[0],
+            'price_alert': price_alerts[0],
+        }
@@ -0,0 +1,84 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.core.models import Stock
+from apps.core.utils.price_alerts import build_rows as price_alert_rows
+from apps.core.utils.stock_search import search_stocks
+from apps.payments.models import NEEDS_INVOICE, Deposit
+from apps.portfolio.models import ChartView, Holding, Lot, Trade
+
+# Plan lines that mean a whole table is read row by row
+SEQUENTIAL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)\s*$'),
+    'mysql': re.compile(r'\btype\W+ALL\b'),
+}
+
+
+def hot_queries():
+    """The queries every page load or background job depends on"""
+    now = timezone.now()
+    return {
+        'dashboard recent deposits': Deposit.objects.filter(user_id=1).order_by('-created_at')[:5],
+        'invoice batch selection': Deposit.objects.filter(NEEDS_INVOICE, status='completed')[:10],
+        'sheets export cursor bootstrap': (
+            Deposit.objects.filter(synced_to_sheets=False).order_by('created_at', 'id')[:1]
+        ),
+        'sheets export page': (
+            Deposit.objects.filter(created_at__gt=now).order_by('created_at', 'id')[:500]
+        ),
+        'sheets export sweep behind the cursor': (
+            Deposit.objects.filter(created_at__lt=now, synced_to_sheets=False).order_by('created_at', 'id')[:500]
+        ),
+        'recent chart views': ChartView.objects.filter(user_id=1)[:5],
+        'active stock list': Stock.objects.filter(is_active=True).order_by('symbol')[:20],
+        'stock list page by price': (
+            Stock.objects.filter(is_active=True, current_price__gte=10)
+            .order_by('current_price', 'id')[:21]
+        ),
+        'stock search': search_stocks(Stock.objects.filter(is_active=True), 'app')[:21],
+        'deposit list page': (
+            Deposit.objects.filter(created_at__lte=now).order_by('-created_at', '-id')[:21]
+        ),
+        'holdings by stock': Holding.objects.filter(stock_id=1),
+        'holding trades': Trade.objects.filter(holding_id=1).order_by('executed_at', 'id'),
+        'open lots, oldest first': Lot.objects.filter(holding_id=1, remaining__gt=0).order_by('acquired_at', 'id'),
+        'price alert thresholds': price_alert_rows(),
+        'unallocated deposits': Deposit.unallocated().order_by('id').values_list('id', flat=True)[:500],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Capture EXPLAIN plans of the hot queries and fail if any falls back to a sequential scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan in full')
+
+    def handle(self, *args, **options):
+        pattern = SEQUENTIAL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(f'No plan checks for the {connection.vendor} backend')
+
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables make a seq scan the cheapest plan; this asks
+                # whether an index *can* serve the query, not whether it wins today
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for label, queryset in hot_queries().items():
+                plan = queryset.explain()
+                scans = [m.group(0) for line in plan.splitlines() if (m := pattern.search(line))]
+                if options['verbose_plans']:
+                    self.stdout.write(f'{label}:\n{plan}\n')
+                if scans:
+                    failures.append(label)
+                    self.stdout.write(self.style.ERROR(f'✗ {label}: {"; ".join(scans)}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f'✓ {label}'))
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries use a sequential scan: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries are served by an index'))
@@ -0,0 +1,102 @@
+import logging
+import time
+from contextlib import nullcontext
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from .utils.db import PRIMARY_COOKIE
+from .utils.query_budget import QueryBudgetExceeded, QueryRecorder, get_query_budget
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that runs natively under both WSGI and ASGI.
+
+    Subclasses implement ``process(request, response)``; the request itself
+    is passed through untouched, so async views never get pushed onto a
+    thread by this middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.wrap(request):
+            response = self.get_response(request)
+        return self.process(request, response)
+
+    async def __acall__(self, request):
+        with self.wrap(request):
+            response = await self.get_response(request)
+        return self.process(request, response)
+
+    def wrap(self, request):
+        """Context manager active while the rest of the stack handles the request"""
+        return nullcontext()
+
+    def process(self, request, response):
+        return response
+
+
+class QueryBudgetMiddleware(AsyncCapableMiddleware):
+    """Count the queries of each request and flag budget overruns and N+1s.
+
+    Budgets come from QUERY_BUDGETS keyed by URL name, or QUERY_BUDGETS_POST
+    for POSTs. Violations are logged, or raised when QUERY_BUDGET_STRICT is
+    on. The count is returned in the X-Query-Count header.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def wrap(self, request):
+        request.query_recorder = QueryRecorder()
+        return request.query_recorder
+
+    def process(self, request, response):
+        recorder = request.query_recorder
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        response['X-Query-Count'] = str(recorder.count)
+
+        problems = recorder.problems(get_query_budget(view_name, request.method))
+        if problems:
+            message = f'{view_name or request.path}: ' + '; '.join(problems)
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(f'⚠️ Query budget exceeded - {message}')
+        return response
+
+
+class ReplicaStickinessMiddleware(AsyncCapableMiddleware):
+    """Keep a client on the primary database briefly after it writes.
+
+    Successful unsafe requests (POST, PUT, PATCH, DELETE) set a short-lived
+    cookie that read_from_replica checks before routing reads to a replica.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                str(time.time() + settings.REPLICA_STICKY_SECONDS),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
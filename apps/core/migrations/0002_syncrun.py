@@ -0,0 +1,40 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.CharField(choices=[('sheets_sync', 'Google Sheets Sync'), ('invoice_batch', 'Invoice Batch')], max_length=30)),
+                ('trigger', models.CharField(choices=[('manual', 'Manual'), ('cron', 'Cron'), ('celery', 'Celery Beat'), ('webhook', 'Webhook')], default='manual', max_length=20)),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed')], max_length=20)),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('duration_ms', models.PositiveIntegerField(default=0)),
+                ('phase_timings', models.JSONField(blank=True, default=dict)),
+                ('rows_read', models.PositiveIntegerField(default=0)),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+                ('rows_skipped', models.PositiveIntegerField(default=0)),
+                ('api_calls', models.PositiveIntegerField(default=0)),
+                ('retries', models.PositiveIntegerField(default=0)),
+                ('error_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', '-started_at'], name='syncrun_job_started_idx')],
+            },
+        ),
+    ]
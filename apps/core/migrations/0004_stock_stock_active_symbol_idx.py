@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_synccursor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['is_active', 'symbol'], name='stock_active_symbol_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    Counter = apps.get_model('core', 'Counter')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Stock = apps.get_model('core', 'Stock')
+    Deposit = apps.get_model('payments', 'Deposit')
+    Counter.objects.bulk_create([
+        Counter(name='users', value=User.objects.count()),
+        Counter(name='stocks', value=Stock.objects.count()),
+        Counter(name='deposits', value=Deposit.objects.count()),
+        Counter(name='completed_deposits', value=Deposit.objects.filter(status='completed').count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_stock_stock_active_symbol_idx'),
+        ('payments', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['name', 'id'], name='stock_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['current_price', 'id'], name='stock_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['change_percent', 'id'], name='stock_change_id_idx'),
+        ),
+    ]
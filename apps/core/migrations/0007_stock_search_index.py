@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from apps.core.utils.stock_search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from apps.core.utils.stock_search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """Trigram search index over stock symbols and names.
+
+    FTS5 on SQLite, pg_trgm GIN indexes on PostgreSQL; other backends (and
+    databases where it cannot be created) search without an index.
+    """
+
+    dependencies = [
+        ('core', '0006_stock_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
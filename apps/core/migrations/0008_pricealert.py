@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-19 15:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_stock_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('threshold', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('triggered_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to='core.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['threshold'],
+                'indexes': [models.Index(fields=['user', 'stock'], name='pricealert_user_stock_idx'), models.Index(condition=models.Q(('is_active', True)), fields=['stock', 'threshold', 'id'], name='pricealert_active_idx')],
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from .utils.cache import bump_alerts_version
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -28,6 +29,16 @@ class Stock(TimeStampedModel):
     last_updated = models.DateTimeField(default=timezone.now)
     is_active = models.BooleanField(default=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'symbol'], name='stock_active_symbol_idx'),
+            # Keyset pages of the stock list for each sort order; nearly all
+            # stocks are active, so is_active is checked while walking these
+            models.Index(fields=['name', 'id'], name='stock_name_id_idx'),
+            models.Index(fields=['current_price', 'id'], name='stock_price_id_idx'),
+            models.Index(fields=['change_percent', 'id'], name='stock_change_id_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.symbol} - {self.name}"
     
@@ -36,6 +47,38 @@ class Stock(TimeStampedModel):
             self.change_percent = ((self.current_price - self.previous_close) / self.previous_close) * 100
         super().save(*args, **kwargs)
 
+class PriceAlert(TimeStampedModel):
+    """Notify ``user`` once when the price of ``stock`` crosses ``threshold``, in either direction"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='price_alerts')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='price_alerts')
+    threshold = models.DecimalField(max_digits=10, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+    triggered_at = models.DateTimeField(null=True, blank=True)
+    triggered_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['threshold']
+        indexes = [
+            models.Index(fields=['user', 'stock'], name='pricealert_user_stock_idx'),
+            # Loading the thresholds the evaluator bisects, in order
+            models.Index(
+                fields=['stock', 'threshold', 'id'], name='pricealert_active_idx',
+                condition=models.Q(is_active=True),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.stock.symbol} crosses ${self.threshold} ({self.user.email})"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_alerts_version()
+    
+    def delete(self, *args, **kwargs):
+        bump_alerts_version()
+        return super().delete(*args, **kwargs)
+
 class StockHistory(TimeStampedModel):
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='history')
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -43,4 +86,104 @@ class StockHistory(TimeStampedModel):
     
     class Meta:
         ordering = ['-date']
-        unique_together = ['stock', 'date']
\ No newline at end of file
+        unique_together = ['stock', 'date']
+
+class SyncRun(TimeStampedModel):
+    """One execution of a sync or invoice batch, with timings and row counts"""
+    JOB_CHOICES = [
+        ('sheets_sync', 'Google Sheets Sync'),
+        ('invoice_batch', 'Invoice Batch'),
+    ]
+    
+    TRIGGER_CHOICES = [
+        ('manual', 'Manual'),
+        ('cron', 'Cron'),
+        ('celery', 'Celery Beat'),
+        ('webhook', 'Webhook'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+    
+    job = models.CharField(max_length=30, choices=JOB_CHOICES)
+    trigger = models.CharField(max_length=20, choices=TRIGGER_CHOICES, default='manual')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    task_id = models.CharField(max_length=255, blank=True)
+    
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    duration_ms = models.PositiveIntegerField(default=0)
+    phase_timings = models.JSONField(default=dict, blank=True)
+    
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    api_calls = models.PositiveIntegerField(default=0)
+    retries = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job', '-started_at'], name='syncrun_job_started_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_job_display()} at {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
+    
+    @property
+    def rows_per_second(self):
+        if not self.duration_ms:
+            return 0
+        return (self.rows_read + self.rows_written) / (self.duration_ms / 1000)
+
+
+class SyncCursor(TimeStampedModel):
+    """High-water mark of an incremental export, ordered by (created_at, id).
+    
+    ``pending_*`` marks the end of a batch that was being written when the
+    run stopped, so the next run can tell which rows already reached the
+    destination.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(default=0)
+    pending_created_at = models.DateTimeField(null=True, blank=True)
+    pending_id = models.BigIntegerField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_created_at} #{self.last_id}"
+    
+    def after_q(self):
+        """Filter for rows strictly after the high-water mark"""
+        if self.last_created_at is None:
+            return models.Q()
+        return (
+            models.Q(created_at__gt=self.last_created_at) |
+            models.Q(created_at=self.last_created_at, id__gt=self.last_id)
+        )
+    
+    def through_q(self):
+        """Filter for rows at or before the high-water mark"""
+        if self.last_created_at is None:
+            return models.Q(pk__in=[])
+        return (
+            models.Q(created_at__lt=self.last_created_at) |
+            models.Q(created_at=self.last_created_at, id__lte=self.last_id)
+        )
+
+
+class Counter(TimeStampedModel):
+    """Precomputed row count, kept current by signals and bulk paths.
+    
+    Reading one row replaces a COUNT(*) over a growing table; the
+    reconcile_counters task periodically corrects any drift.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.payments.models import Deposit
+from .models import Stock
+from .utils import counters
+
+
+@receiver(post_save, sender=User)
+def count_created_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment('users')
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    counters.increment('users', -1)
+
+
+@receiver(post_save, sender=Stock)
+def count_created_stock(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.increment('stocks')
+
+
+@receiver(post_delete, sender=Stock)
+def count_deleted_stock(sender, instance, **kwargs):
+    counters.increment('stocks', -1)
+
+
+@receiver(post_save, sender=Deposit)
+def count_completed_deposit(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.increment('deposits')
+    # Deposit.save() records the status it read before saving
+    was_completed = not created and instance._previous_status == 'completed'
+    is_completed = instance.status == 'completed'
+    if is_completed != was_completed:
+        counters.increment('completed_deposits', 1 if is_completed else -1)
+
+
+@receiver(post_delete, sender=Deposit)
+def count_deleted_deposit(sender, instance, **kwargs):
+    counters.increment('deposits', -1)
+    if instance.status == 'completed':
+        counters.increment('completed_deposits', -1)
@@ -1,7 +1,15 @@
 from celery import shared_task
 import logging
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
 from django.utils import timezone
-from ..models import Stock
+from .models import PriceAlert, Stock
+from .utils.live_prices import publish_quotes
+from .utils import counters
+from .utils.cache import bump_price_epoch
+from .utils.leaderboards import refresh_leaderboards
+from .utils.price_alerts import evaluate_price_alerts
 import random
 
 logger = logging.getLogger(__name__)
@@ -13,6 +21,7 @@ def update_stock_prices():
     
     stocks = Stock.objects.filter(is_active=True)
     updated = 0
+    moves = {}
     
     for stock in stocks:
         # Mock price update - in real app, fetch from API
@@ -24,7 +33,62 @@ def update_stock_prices():
         stock.current_price = round(new_price, 2)
         stock.last_updated = timezone.now()
         stock.save()
+        moves[stock.id] = (old_price, stock.current_price)
         updated += 1
     
+    publish_quotes(stocks)
+    bump_price_epoch()
+    refresh_leaderboards()
+    evaluate_price_alerts(moves)
     logger.info(f"Updated {updated} stock prices")
-    return f"Updated {updated} stock prices"
\ No newline at end of file
+    return f"Updated {updated} stock prices"
+
+@shared_task
+def reconcile_counters():
+    """Recount the maintained counters, correcting drift from unsignalled writes"""
+    drift = counters.reconcile()
+    logger.info(f"Reconciled counters, drift: {drift or 'none'}")
+    return drift
+
+@shared_task
+def send_price_alerts(alert_ids=None):
+    """Email the owners of triggered price alerts, one SMTP connection per batch.
+    
+    Called with the ids of one batch as alerts trigger; without ids it sends
+    every triggered alert still unnotified, e.g. because queueing failed.
+    """
+    pending = PriceAlert.objects.filter(triggered_at__isnull=False, notified_at__isnull=True)
+    if alert_ids is not None:
+        pending = pending.filter(id__in=alert_ids)
+    with transaction.atomic():
+        # The batch task and the beat sweep can reach the same alerts; only
+        # the one that claims them sends
+        claimed = list(
+            pending.select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:settings.PRICE_ALERT_BATCH_SIZE]
+        )
+        PriceAlert.objects.filter(id__in=claimed).update(notified_at=timezone.now())
+    alerts = list(PriceAlert.objects.filter(id__in=claimed).select_related('user', 'stock'))
+    
+    try:
+        send_mass_mail([
+            (
+                f"{alert.stock.symbol} crossed ${alert.threshold}",
+                f"{alert.stock.name} ({alert.stock.symbol}) is now trading at "
+                f"${alert.triggered_price}, crossing your alert at ${alert.threshold}.",
+                None,
+                [alert.user.email],
+            )
+            for alert in alerts
+            if alert.user.email
+        ])
+    except Exception:
+        # Release the claim so the beat sweep retries them
+        PriceAlert.objects.filter(id__in=claimed).update(notified_at=None)
+        raise
+    
+    logger.info(f"Sent {len(alerts)} price alert notifications")
+    if alert_ids is None and len(claimed) == settings.PRICE_ALERT_BATCH_SIZE:
+        # More left over; send them as a batch of their own
+        send_price_alerts.delay()
+    return len(alerts)
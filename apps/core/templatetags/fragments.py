@@ -0,0 +1,50 @@
+import logging
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = make_template_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on]
+        )
+        try:
+            value = cache.get(key)
+        except Exception as e:
+            logger.warning(f'⚠️ Cache unavailable for fragment {self.fragment_name}: {e}')
+            return self.nodelist.render(context)
+        if value is None:
+            value = self.nodelist.render(context)
+            try:
+                cache.set(key, value, settings.FRAGMENT_CACHE_TTL)
+            except Exception as e:
+                logger.warning(f'⚠️ Could not cache fragment {self.fragment_name}: {e}')
+        return value
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """Cache a fragment for FRAGMENT_CACHE_TTL seconds, varying on the given values.
+
+    Like Django's ``{% cache %}``, but a cache outage renders the fragment
+    instead of failing the page::
+
+        {% fragment_cache dashboard user.id fragment_version %} ... {% endfragment_cache %}
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 2:
+        raise template.TemplateSyntaxError(f'{tokens[0]!r} tag requires a fragment name')
+    return FragmentCacheNode(nodelist, tokens[1], [parser.compile_filter(t) for t in tokens[2:]])
@@ -0,0 +1,63 @@
+import base64
+import json
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from apps.core.models import Stock
+from apps.core.utils.pagination import encode_cursor
+from apps.core.utils.stock_search import search_stocks
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+class KeysetCursorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('investor', 'investor@example.com', 'secret')
+        self.client.force_login(self.user)
+        for symbol, price in [('AAPL', '180.00'), ('MSFT', '410.00'), ('NVDA', '120.00')]:
+            Stock.objects.create(symbol=symbol, name=f'{symbol} Inc', current_price=Decimal(price))
+
+    def test_stock_list_rejects_cursor_with_wrong_typed_values(self):
+        response = self.client.get(reverse('core:stock_list'), {'sort': 'current_price', 'after': raw_cursor(['x', 1])})
+        self.assertEqual(response.status_code, 404)
+
+    def test_stock_list_rejects_null_in_non_nullable_field(self):
+        response = self.client.get(reverse('core:stock_list'), {'sort': 'current_price', 'after': raw_cursor([None, 1])})
+        self.assertEqual(response.status_code, 404)
+
+    def test_stock_list_accepts_its_own_cursor(self):
+        response = self.client.get(
+            reverse('core:stock_list'), {'sort': 'current_price', 'after': encode_cursor(['150.00', 1])}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_deposit_list_rejects_cursor_with_wrong_typed_values(self):
+        response = self.client.get(reverse('payments:deposit_list'), {'after': raw_cursor(['x', 1])})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('payments:deposit_list'), {'before': raw_cursor(['2026-01-01T00:00:00Z', 'y'])})
+        self.assertEqual(response.status_code, 404)
+
+
+class StockSearchTests(TestCase):
+    def setUp(self):
+        for symbol, name in [('AAPL', 'Apple Inc'), ('MSFT', 'Microsoft Corp'), ('MA', 'Mastercard Inc')]:
+            Stock.objects.create(symbol=symbol, name=name, current_price=Decimal('100.00'))
+
+    def search(self, query):
+        return list(search_stocks(Stock.objects.all(), query).order_by('search_rank', 'symbol').values_list(
+            'symbol', 'search_rank'
+        ))
+
+    def test_short_query_matches_symbol_and_name_prefixes(self):
+        self.assertEqual(self.search('ap'), [('AAPL', 2)])
+        self.assertEqual(self.search('m'), [('MA', 1), ('MSFT', 1)])
+        self.assertEqual(self.search('ma'), [('MA', 0)])
+
+    def test_short_query_skips_other_substrings(self):
+        self.assertEqual(self.search('nc'), [])
+
+    def test_long_query_matches_any_substring(self):
+        self.assertEqual(self.search('card'), [('MA', 3)])
@@ -9,4 +9,6 @@ urlpatterns = [
     path('profile/', views.ProfileView.as_view(), name='profile'),
     path('stocks/', views.StockListView.as_view(), name='stock_list'),
     path('stocks/<str:symbol>/', views.StockDetailView.as_view(), name='stock_detail'),
+    path('stocks/<str:symbol>/alerts/', views.AddPriceAlertView.as_view(), name='add_price_alert'),
+    path('alerts/<int:pk>/delete/', views.DeletePriceAlertView.as_view(), name='delete_price_alert'),
 ]
\ No newline at end of file
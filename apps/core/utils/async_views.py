@@ -0,0 +1,19 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+
+
+async def is_authenticated(request):
+    """Resolve the lazy request.user off the event loop"""
+    return await sync_to_async(lambda: request.user.is_authenticated)()
+
+
+def async_login_required(view_func):
+    """login_required for async views, redirecting anonymous users to login"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if not await is_authenticated(request):
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
@@ -0,0 +1,189 @@
+import logging
+import operator
+import time
+import uuid
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.utils.functional import SimpleLazyObject
+
+logger = logging.getLogger(__name__)
+
+# How long, and how often, a cold miss that lost the lock polls for the
+# value its winner is computing
+LOCK_WAIT = 2
+LOCK_POLL_INTERVAL = 0.05
+
+# Delete the lock only if it still holds our token
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _acquire(key):
+    """Take the recompute lock; returns the token that owns it, or None"""
+    # An int, which the Redis backend stores as is rather than pickled
+    token = uuid.uuid4().int >> 64
+    return token if cache.add(_lock_key(key), token, settings.CACHE_LOCK_TIMEOUT) else None
+
+
+def _release(key, token):
+    """Drop the recompute lock only if ``token`` still owns it.
+
+    An ``fn()`` that outran CACHE_LOCK_TIMEOUT must not delete the lock a
+    later worker has taken since.
+    """
+    lock_key = _lock_key(key)
+    try:
+        backend = caches['default']
+        if isinstance(backend, RedisCache):
+            redis_key = backend.make_and_validate_key(lock_key)
+            backend._cache.get_client(redis_key, write=True).eval(RELEASE_LOCK_SCRIPT, 1, redis_key, token)
+        elif cache.get(lock_key) == token:
+            # Process-local backends: nothing outside this process holds the lock
+            cache.delete(lock_key)
+    except Exception as e:
+        logger.warning(f'⚠️ Could not release lock {lock_key}: {e}')
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cached_compute(key, ttl, fn, grace=None):
+    """Return ``fn()``, cached for ``ttl`` seconds and recomputed by one worker at a time.
+
+    Entries outlive their TTL by ``grace`` seconds (CACHE_STALE_GRACE). The
+    first caller to see an expired entry takes a lock and recomputes it while
+    everyone else keeps serving the stale value, so a hot key expiring never
+    sends every worker to the database at once. On a cold miss the callers
+    that lose the lock wait briefly for the winner's value instead.
+
+    A cache outage degrades to calling ``fn()`` directly.
+    """
+    grace = settings.CACHE_STALE_GRACE if grace is None else grace
+    try:
+        entry = cache.get(key)
+        if entry is not None and time.time() < entry[1]:
+            return entry[0]
+        token = _acquire(key)
+        if token is None:
+            # Someone else is computing; serve stale, or wait on a cold miss
+            if entry is None:
+                entry = _wait_for(key)
+            if entry is not None:
+                return entry[0]
+            logger.warning(f'⚠️ Gave up waiting for {key} to be computed, computing it here')
+    except Exception as e:
+        logger.warning(f'⚠️ Cache unavailable for {key}: {e}')
+        token = None
+    if token is None:
+        return fn()
+
+    try:
+        value = fn()
+        store(key, ttl, value, grace)
+        return value
+    finally:
+        _release(key, token)
+
+
+def store(key, ttl, value, grace=None):
+    """Put a freshly computed ``value`` under a cached_compute key ahead of its next read"""
+    grace = settings.CACHE_STALE_GRACE if grace is None else grace
+    try:
+        cache.set(key, (value, time.time() + ttl), ttl + grace)
+    except Exception as e:
+        logger.warning(f'⚠️ Could not cache {key}: {e}')
+
+
+def _delete(key):
+    try:
+        cache.delete(key)
+    except Exception as e:
+        logger.warning(f'⚠️ Could not delete cache key {key}: {e}')
+
+
+def invalidate(key):
+    """Drop a cached_compute entry whose source data has changed"""
+    _delete(key)
+
+
+def _version(key):
+    try:
+        version = cache.get(key)
+        if version is None:
+            # Never restart from a fixed value: fragments cached under the
+            # evicted version would be served again
+            cache.add(key, time.time_ns(), None)
+            version = cache.get(key)
+        return version
+    except Exception as e:
+        logger.warning(f'⚠️ Could not read version {key}: {e}')
+        return None
+
+
+def _bump(key):
+    try:
+        cache.set(key, time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f'⚠️ Could not bump version {key}: {e}')
+
+
+def _data_version_key(user_id):
+    return f'user:{user_id}:data_version'
+
+
+def data_version(user_id):
+    """Token that changes whenever one of the user's portfolios, holdings, deposits or chart views is written"""
+    return _version(_data_version_key(user_id))
+
+
+def bump_data_version(user_id):
+    _bump(_data_version_key(user_id))
+
+
+def price_epoch():
+    """Token that changes with every price sync"""
+    return _version('prices:epoch')
+
+
+def bump_price_epoch():
+    _bump('prices:epoch')
+
+
+def alerts_version():
+    """Token that changes whenever a price alert is added, removed or triggered"""
+    return _version('alerts:version')
+
+
+def bump_alerts_version():
+    _bump('alerts:version')
+
+
+def fragment_version(user_id):
+    """Cache-tag vary_on value for a fragment built from a user's data at current prices"""
+    return f'{price_epoch()}:{data_version(user_id)}'
+
+
+def deferred(fn, *keys):
+    """Template context entries for ``keys`` of the dict ``fn()`` returns, computed on first use.
+
+    When the fragment that uses them is served from cache, ``fn`` never runs.
+    """
+    data = SimpleLazyObject(fn)
+    return {key: SimpleLazyObject(partial(operator.getitem, data, key)) for key in keys}
@@ -0,0 +1,59 @@
+import logging
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.utils import timezone
+from apps.core.models import Counter, Stock
+
+logger = logging.getLogger(__name__)
+
+
+def _deposits(**filters):
+    from apps.payments.models import Deposit
+    return Deposit.objects.filter(**filters).count()
+
+
+# The query each counter stands in for, run only to seed or reconcile it
+COUNTERS = {
+    'users': lambda: User.objects.count(),
+    'stocks': lambda: Stock.objects.count(),
+    'deposits': lambda: _deposits(),
+    'completed_deposits': lambda: _deposits(status='completed'),
+}
+
+
+def increment(name, delta=1):
+    """Adjust a counter in the caller's transaction, seeding it if missing"""
+    updated = Counter.objects.filter(name=name).update(
+        value=F('value') + delta, updated_at=timezone.now()
+    )
+    if not updated:
+        refresh(name)
+
+
+def refresh(name):
+    """Recount a counter from its source table; returns the new value"""
+    value = COUNTERS[name]()
+    Counter.objects.update_or_create(name=name, defaults={'value': value})
+    return value
+
+
+def read(*names):
+    """Current values of the named counters (all of them by default) in one query"""
+    names = names or tuple(COUNTERS)
+    values = dict(Counter.objects.filter(name__in=names).values_list('name', 'value'))
+    for name in names:
+        if name not in values:
+            values[name] = refresh(name)
+    return values
+
+
+def reconcile():
+    """Recount every counter and return the drift that was corrected"""
+    stored = dict(Counter.objects.values_list('name', 'value'))
+    drift = {}
+    for name in COUNTERS:
+        value = refresh(name)
+        if name in stored and stored[name] != value:
+            drift[name] = value - stored[name]
+            logger.warning(f'⚠️ Counter {name} drifted by {drift[name]}, corrected to {value}')
+    return drift
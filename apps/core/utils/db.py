@@ -0,0 +1,97 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Set while a read_from_replica view runs
+_use_replica = ContextVar('use_replica', default=False)
+
+PRIMARY_COOKIE = 'db_primary_until'
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Use WAL journaling on SQLite so readers don't block behind a writer.
+    
+    WAL is persistent in the database file; synchronous=NORMAL is the
+    recommended durability level for it and applies per connection. The
+    pragmas go straight to the driver connection so they don't show up in
+    query counts.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    connection.connection.execute('PRAGMA journal_mode=WAL')
+    connection.connection.execute('PRAGMA synchronous=NORMAL')
+
+
+class ReplicaRouter:
+    """Send reads of replica-tolerant views to DATABASE_REPLICAS.
+    
+    Writes, migrations and reads inside a transaction on the primary always
+    use the primary.
+    """
+    
+    def db_for_read(self, model, **hints):
+        if (
+            _use_replica.get()
+            and settings.DATABASE_REPLICAS
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+    
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def recently_wrote(request):
+    """True if this client wrote within REPLICA_STICKY_SECONDS"""
+    try:
+        return float(request.COOKIES.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_from_replica(view_func):
+    """Route the reads of a view (and its template rendering) to a replica.
+    
+    Clients that wrote recently keep reading from the primary. Use on
+    function views directly and on class-based views with method_decorator.
+    """
+    def render(response):
+        # Evaluate lazy querysets in TemplateResponses while still routed
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+    
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if recently_wrote(request):
+                return await view_func(request, *args, **kwargs)
+            token = _use_replica.set(True)
+            try:
+                return render(await view_func(request, *args, **kwargs))
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+    
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if recently_wrote(request):
+            return view_func(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return render(view_func(request, *args, **kwargs))
+        finally:
+            _use_replica.reset(token)
+    return wrapper
@@ -1,93 +1,167 @@
 import gspread
-import json
-import os
-from oauth2client.service_account import ServiceAccountCredentials
 from django.conf import settings
+from .sheet_backends import get_sheet_backend
+from .rate_limit import RequestScheduler, TokenBucket
 from datetime import datetime
+from itertools import zip_longest
 import logging
+import numpy as np
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# Header row of the deposits worksheet (Sheet 2), in the order rows are written
+DEPOSIT_HEADER = [
+    'Date', 'User Email', 'Company', 'Amount', 'Payment Method', 'Status',
+    'Transaction ID', 'Invoice Number', 'Stock', 'Portfolio', 'Sync Timestamp',
+]
+
+# 1-based column of the transaction ID in the deposits worksheet
+DEPOSIT_TRANSACTION_ID_COLUMN = DEPOSIT_HEADER.index('Transaction ID') + 1
+
+# Stock worksheet columns coerced to numbers, and the characters dropped first
+STOCK_NUMERIC_COLUMNS = {
+    'Price': 'price',
+    'Previous Close': 'previous_close',
+    'Volume': 'volume',
+}
+NUMBER_NOISE = str.maketrans('', '', '$, \t\r\n\xa0')
+CELL_SEPARATOR = '\x1f'
+
+_quota_bucket = None
+
+def get_quota_bucket():
+    """Token bucket for the Sheets API quota, shared across processes"""
+    global _quota_bucket
+    if _quota_bucket is None:
+        _quota_bucket = TokenBucket('google_sheets', settings.GOOGLE_SHEETS_REQUESTS_PER_MINUTE)
+    return _quota_bucket
+
+def _text_column(columns, name, length):
+    if name not in columns:
+        return np.full(length, '', dtype=object)
+    return np.array([cell.strip() for cell in columns[name]], dtype=object)
+
+def _numeric_column(columns, name, length):
+    """Coerce a column to floats; NaN marks blank or invalid cells"""
+    if name not in columns:
+        return np.full(length, np.nan), np.zeros(length, dtype=bool)
+    # One translate over the joined column strips currency noise at C speed
+    joined = CELL_SEPARATOR.join(columns[name]).translate(NUMBER_NOISE)
+    cleaned = np.array(joined.split(CELL_SEPARATOR), dtype=object)
+    numbers = pd.to_numeric(pd.Series(cleaned), errors='coerce').to_numpy(dtype=float)
+    return numbers, np.isnan(numbers) & (cleaned != '')
+
+def parse_stock_prices(values):
+    """Parse raw Sheet 1 values (header row first) into stock price dicts.
+    
+    The numeric columns are cleaned and coerced in one vectorized pass.
+    Rows with a symbol but an unparseable number are left out and reported
+    in the returned error list, one message per row.
+    """
+    if len(values) < 2:
+        return [], []
+    
+    # Transpose the rows into columns, padding short rows with blanks
+    header = [str(cell).strip() for cell in values[0]]
+    length = len(values) - 1
+    columns = dict(zip(header, zip_longest(*values[1:], fillvalue='')))
+    
+    symbols = _text_column(columns, 'Symbol', length)
+    names = _text_column(columns, 'Name', length)
+    last_updated = _text_column(columns, 'Last Updated', length)
+    
+    numbers = {}
+    invalid = {}
+    for column, key in STOCK_NUMERIC_COLUMNS.items():
+        numbers[key], invalid[column] = _numeric_column(columns, column, length)
+    
+    has_symbol = symbols != ''
+    bad_rows = has_symbol & np.logical_or.reduce(list(invalid.values()))
+    errors = [
+        f"Error processing record {row}: invalid "
+        + ', '.join(column for column, mask in invalid.items() if mask[row])
+        for row in np.flatnonzero(bad_rows)
+    ]
+    
+    keep = has_symbol & ~bad_rows
+    if not keep.any():
+        return [], errors
+    
+    # Missing prices read as 0; a missing or zero previous close or volume
+    # reads as None, so change_percent is never derived from a 0 close
+    price = np.nan_to_num(numbers['price'][keep]).tolist()
+    previous_close = [value if value == value and value else None for value in numbers['previous_close'][keep].tolist()]
+    volume = [int(value) if value == value and value else None for value in numbers['volume'][keep].tolist()]
+    symbol = symbols[keep]
+    name = np.where(names[keep] != '', names[keep], symbol).tolist()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    updated = np.where(last_updated[keep] != '', last_updated[keep], now).tolist()
+    
+    price_data = [
+        {
+            'symbol': row[0],
+            'name': row[1],
+            'price': row[2],
+            'previous_close': row[3],
+            'volume': row[4],
+            'last_updated': row[5],
+        }
+        for row in zip(symbol.tolist(), name, price, previous_close, volume, updated)
+    ]
+    return price_data, errors
+
 class GoogleSheetsClient:
-    def __init__(self, sheet_id=None):
+    def __init__(self, sheet_id=None, backend=None):
         self.sheet_id = sheet_id or settings.GOOGLE_SHEETS_ID
-        self.client = self._authenticate()
-        self.sheet = self.client.open_by_key(self.sheet_id)
-    
-    def _authenticate(self):
-        """Authenticate with Google Sheets API using environment variable"""
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive",
-            "https://www.googleapis.com/auth/spreadsheets"
-        ]
-        
-        # Get credentials from environment variable (minified JSON)
-        creds_json = os.environ.get('GOOGLE_SHEETS_CREDENTIALS')
-        
-        if not creds_json:
-            # Fallback to environment variable with different name
-            creds_json = os.environ.get('GOOGLE_SHEETS_CREDENTIALS_JSON')
-            
-        if creds_json:
-            try:
-                # Parse the JSON string
-                creds_dict = json.loads(creds_json)
-                creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-                logger.info("✅ Authenticated using GOOGLE_SHEETS_CREDENTIALS environment variable")
-                return gspread.authorize(creds)
-            except json.JSONDecodeError as e:
-                logger.error(f"❌ Failed to parse GOOGLE_SHEETS_CREDENTIALS JSON: {e}")
-                logger.error("Make sure the environment variable contains valid minified JSON")
-                raise Exception(f"Invalid JSON in GOOGLE_SHEETS_CREDENTIALS: {e}")
-            except Exception as e:
-                logger.error(f"❌ Failed to authenticate with credentials from environment: {e}")
-                raise
-        
-        # If no environment variable, try credentials.json file (for local development)
-        creds_file = os.path.join(settings.BASE_DIR, 'credentials.json')
-        if os.path.exists(creds_file):
+        self.backend = backend or get_sheet_backend()
+        self.api_calls = 0
+        self.stock_errors = []
+        self.scheduler = None
+        if self.backend.rate_limited:
+            self.scheduler = RequestScheduler(
+                get_quota_bucket(),
+                max_retries=settings.GOOGLE_SHEETS_MAX_RETRIES,
+                backoff_base=settings.GOOGLE_SHEETS_BACKOFF_BASE,
+                backoff_max=settings.GOOGLE_SHEETS_BACKOFF_MAX,
+            )
+        self._worksheets = {}
+        self.sheet = self._request(self.backend.open, self.sheet_id)
+    
+    @property
+    def retries(self):
+        """Number of rate-limited calls that were retried"""
+        return self.scheduler.retries if self.scheduler else 0
+    
+    def _request(self, func, *args, **kwargs):
+        """Run one outbound call against the sheet backend, paced by the quota scheduler"""
+        self.api_calls += 1
+        if self.scheduler is None:
+            return func(*args, **kwargs)
+        return self.scheduler.call(func, *args, **kwargs)
+    
+    def _get_worksheet(self, title, index):
+        """Look a worksheet up by name, falling back to its index"""
+        if title not in self._worksheets:
             try:
-                creds = ServiceAccountCredentials.from_json_keyfile_name(creds_file, scope)
-                logger.info("✅ Authenticated using credentials.json file (local development)")
-                return gspread.authorize(creds)
-            except Exception as e:
-                logger.error(f"❌ Failed to authenticate with credentials.json: {e}")
-                raise
-        
-        # No credentials found
-        error_msg = (
-            "❌ No Google Sheets credentials found.\n"
-            "Please set GOOGLE_SHEETS_CREDENTIALS environment variable with your minified service account JSON.\n"
-            "For local development, you can also place credentials.json in the project root."
-        )
-        logger.error(error_msg)
-        raise Exception(error_msg)
+                # Try to get worksheet by name first
+                self._worksheets[title] = self._request(self.sheet.worksheet, title)
+            except gspread.WorksheetNotFound:
+                # Fall back to index
+                self._worksheets[title] = self._request(self.sheet.get_worksheet, index)
+        return self._worksheets[title]
     
     def get_deposits_worksheet(self):
         """Get the worksheet containing deposit data (Sheet 2)"""
-        try:
-            # Try to get worksheet by name first
-            return self.sheet.worksheet("Sheet2")
-        except gspread.WorksheetNotFound:
-            # Fall back to index 1
-            return self.sheet.get_worksheet(1)
+        return self._get_worksheet("Sheet2", 1)
     
     def get_stocks_worksheet(self):
         """Get the worksheet containing stock data (Sheet 1)"""
-        try:
-            # Try to get worksheet by name first
-            return self.sheet.worksheet("Sheet1")
-        except gspread.WorksheetNotFound:
-            # Fall back to index 0
-            return self.sheet.get_worksheet(0)
+        return self._get_worksheet("Sheet1", 0)
     
-    def append_deposit(self, deposit):
-        """Append deposit data to sheets (Sheet 2)"""
-        worksheet = self.get_deposits_worksheet()
-        
-        # Prepare row data
-        row = [
+    def _deposit_row(self, deposit):
+        """Sheet 2 row for a deposit"""
+        return [
             deposit.created_at.strftime('%Y-%m-%d'),
             deposit.user.email,
             deposit.user.profile.company if hasattr(deposit.user, 'profile') else '',
@@ -100,61 +174,37 @@ class GoogleSheetsClient:
             deposit.portfolio.name if deposit.portfolio else 'N/A',
             datetime.now().strftime('%Y-%m-%d %H:%M:%S'),  # Sync timestamp
         ]
-        
-        worksheet.append_row(row)
+    
+    def append_deposit(self, deposit):
+        """Append deposit data to sheets (Sheet 2)"""
+        worksheet = self.get_deposits_worksheet()
+        self._request(worksheet.append_row, self._deposit_row(deposit))
         logger.info(f"Deposit {deposit.transaction_id} appended to sheets")
     
+    def append_deposits(self, deposits):
+        """Append a batch of deposits to sheets (Sheet 2) in a single request"""
+        if not deposits:
+            return
+        worksheet = self.get_deposits_worksheet()
+        self._request(worksheet.append_rows, [self._deposit_row(deposit) for deposit in deposits])
+        logger.info(f"{len(deposits)} deposits appended to sheets")
+    
+    def get_deposit_transaction_ids(self):
+        """Transaction IDs already present in sheets (Sheet 2, column G)"""
+        worksheet = self.get_deposits_worksheet()
+        return set(self._request(worksheet.col_values, DEPOSIT_TRANSACTION_ID_COLUMN)[1:])
+    
     def get_stock_prices(self):
         """Get latest stock prices from sheets (Sheet 1)"""
         worksheet = self.get_stocks_worksheet()
         logger.info(f"Fetching stock prices from worksheet: {worksheet.title}")
         
-        # Get all records
-        records = worksheet.get_all_records()
-        logger.info(f"Retrieved {len(records)} records from Google Sheets")
+        values = self._request(worksheet.get_all_values)
+        logger.info(f"Retrieved {max(len(values) - 1, 0)} records from Google Sheets")
         
-        # Process records
-        price_data = []
-        for idx, record in enumerate(records):
-            # Debug: print first few records
-            if idx < 3:
-                logger.info(f"Record {idx}: {record}")
-            
-            # Only process if symbol exists
-            symbol = record.get('Symbol', '').strip()
-            if not symbol:
-                continue
-                
-            try:
-                # Handle price - could be string or number
-                price_val = record.get('Price', 0)
-                if isinstance(price_val, str):
-                    price_val = price_val.replace('$', '').replace(',', '')
-                price = float(price_val or 0)
-                
-                # Handle previous close
-                prev_close_val = record.get('Previous Close', 0)
-                if prev_close_val and isinstance(prev_close_val, str):
-                    prev_close_val = prev_close_val.replace('$', '').replace(',', '')
-                previous_close = float(prev_close_val) if prev_close_val else None
-                
-                # Handle volume
-                volume_val = record.get('Volume', 0)
-                if volume_val and isinstance(volume_val, str):
-                    volume_val = volume_val.replace(',', '')
-                volume = int(float(volume_val)) if volume_val else None
-                
-                price_data.append({
-                    'symbol': symbol,
-                    'name': record.get('Name', '').strip() or symbol,
-                    'price': price,
-                    'previous_close': previous_close,
-                    'volume': volume,
-                    'last_updated': record.get('Last Updated', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-                })
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Error processing record {idx}: {e}")
-                continue
+        price_data, self.stock_errors = parse_stock_prices(values)
+        for message in self.stock_errors:
+            logger.warning(message)
         
         logger.info(f"Processed {len(price_data)} valid stock records")
         return price_data
@@ -162,7 +212,7 @@ class GoogleSheetsClient:
     def get_deposits(self):
         """Get deposit data from sheets (Sheet 2)"""
         worksheet = self.get_deposits_worksheet()
-        records = worksheet.get_all_records()
+        records = self._request(worksheet.get_all_records)
         logger.info(f"Retrieved {len(records)} deposit records from Google Sheets")
         return records
     
@@ -171,20 +221,27 @@ class GoogleSheetsClient:
         worksheet = self.get_stocks_worksheet()
         
         # Find the row with this symbol
-        cell = worksheet.find(symbol)
+        cell = self._request(worksheet.find, symbol)
         if cell:
             # Update price (assuming price is in column C)
-            worksheet.update_cell(cell.row, 3, price)
+            self._request(worksheet.update_cell, cell.row, 3, price)
             if previous_close:
-                worksheet.update_cell(cell.row, 4, previous_close)
+                self._request(worksheet.update_cell, cell.row, 4, previous_close)
             # Update timestamp (assuming column F)
-            worksheet.update_cell(cell.row, 6, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self._request(worksheet.update_cell, cell.row, 6, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
             return True
         return False
     
+    def get_all_worksheet_values(self):
+        """Get the raw cell values of every worksheet"""
+        return [
+            {'title': worksheet.title, 'values': self._request(worksheet.get_all_values)}
+            for worksheet in self._request(self.sheet.worksheets)
+        ]
+    
     def create_worksheet_if_not_exists(self, title, rows=100, cols=20):
         """Create a worksheet if it doesn't exist"""
         try:
-            return self.sheet.worksheet(title)
+            return self._request(self.sheet.worksheet, title)
         except gspread.WorksheetNotFound:
-            return self.sheet.add_worksheet(title, rows, cols)
\ No newline at end of file
+            return self._request(self.sheet.add_worksheet, title, rows, cols)
\ No newline at end of file
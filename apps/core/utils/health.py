@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+import redis
+from asgiref.sync import sync_to_async
+from celery import current_app
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def check_database():
+    connection = connections['default']
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    finally:
+        # Probe threads come from a pool, so never leave a connection behind
+        connection.close()
+
+
+_probe_redis = None
+
+
+def check_redis():
+    # A client of its own, so the ping gives up within the probe timeout
+    # instead of the shared client's longer one
+    global _probe_redis
+    if _probe_redis is None:
+        timeout = settings.READINESS_CHECK_TIMEOUT
+        _probe_redis = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=timeout, socket_connect_timeout=timeout)
+    _probe_redis.ping()
+
+
+def check_broker():
+    timeout = settings.READINESS_CHECK_TIMEOUT
+    with current_app.connection_for_write(
+        connect_timeout=timeout,
+        transport_options={'socket_timeout': timeout, 'socket_connect_timeout': timeout},
+    ) as conn:
+        conn.ensure_connection(max_retries=1, interval_start=0)
+
+
+def check_storage():
+    # The storage root must be reachable; an empty name checks it without
+    # listing or reading any file
+    if not default_storage.exists(''):
+        raise OSError('media storage root does not exist')
+
+
+CHECKS = {
+    'database': check_database,
+    'redis': check_redis,
+    'broker': check_broker,
+    'storage': check_storage,
+}
+
+
+async def _run_check(name, check):
+    # wait_for stops waiting but cannot stop the thread, so every check also
+    # bounds its own I/O (DATABASE_CONNECT_TIMEOUT, the socket timeouts
+    # above) and a hung dependency never piles up stuck probe threads
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(
+            sync_to_async(check, thread_sensitive=False)(),
+            settings.READINESS_CHECK_TIMEOUT,
+        )
+        result = {'ok': True}
+    except asyncio.TimeoutError:
+        result = {'ok': False, 'error': f'timed out after {settings.READINESS_CHECK_TIMEOUT}s'}
+    except Exception as e:
+        result = {'ok': False, 'error': str(e)}
+    result['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    if not result['ok']:
+        logger.warning(f"⚠️ Readiness check {name} failed: {result['error']}")
+    return name, result
+
+
+async def run_checks():
+    """Ping every dependency concurrently, each bounded by READINESS_CHECK_TIMEOUT"""
+    results = dict(await asyncio.gather(*(_run_check(name, check) for name, check in CHECKS.items())))
+    required_ok = all(results[name]['ok'] for name in settings.READINESS_REQUIRED)
+    if not required_ok:
+        status = 'unavailable'
+    elif all(result['ok'] for result in results.values()):
+        status = 'ready'
+    else:
+        status = 'degraded'
+    return {'status': status, 'checks': results}
+
+
+_cached = None
+_cached_at = 0.0
+_refresh_lock = None
+_lock_loop = None
+
+
+async def readiness():
+    """Latest readiness report, re-checked at most every READINESS_CACHE_SECONDS.
+
+    Kept in process memory rather than the shared cache, which is itself one
+    of the dependencies being probed. Probes arriving while a check is in
+    flight wait for it instead of starting their own.
+    """
+    global _cached, _cached_at, _refresh_lock, _lock_loop
+    # An asyncio lock belongs to one event loop; under WSGI each request
+    # runs in a fresh loop, so only the time-based reuse applies there
+    loop = asyncio.get_running_loop()
+    if _lock_loop is not loop:
+        _refresh_lock, _lock_loop = asyncio.Lock(), loop
+    lock = _refresh_lock
+    async with lock:
+        if _cached is None or time.monotonic() - _cached_at >= settings.READINESS_CACHE_SECONDS:
+            _cached = await run_checks()
+            _cached_at = time.monotonic()
+        return _cached
@@ -0,0 +1,96 @@
+import time
+import logging
+from contextlib import contextmanager
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_RECORDED_ERRORS = 50
+
+class SyncRunRecorder:
+    """Collect timings and counters for one run and write a single SyncRun row.
+    
+    Usage::
+    
+        with SyncRunRecorder('sheets_sync', trigger='cron') as run:
+            with run.phase('from_sheets'):
+                ...
+                run.rows_read += n
+    """
+    
+    def __init__(self, job, trigger='manual', task_id=''):
+        self.job = job
+        self.trigger = trigger or 'manual'
+        self.task_id = task_id or ''
+        self.phase_timings = {}
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rows_skipped = 0
+        self.api_calls = 0
+        self.retries = 0
+        self.errors = []
+        self.error_count = 0
+        self.failed = False
+        self.run = None
+    
+    def __enter__(self):
+        self.started_at = timezone.now()
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.fail(str(exc))
+        self.save()
+        return False
+    
+    @contextmanager
+    def phase(self, name):
+        """Time a named phase; repeated phases accumulate"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = round((time.perf_counter() - start) * 1000)
+            self.phase_timings[name] = self.phase_timings.get(name, 0) + elapsed
+    
+    def error(self, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_RECORDED_ERRORS:
+            self.errors.append(message)
+    
+    def fail(self, message):
+        self.failed = True
+        self.error(message)
+    
+    def track_client(self, client):
+        """Copy API-call and retry counters from a GoogleSheetsClient"""
+        self.api_calls = client.api_calls
+        self.retries = client.retries
+    
+    def save(self):
+        from apps.core.models import SyncRun
+        
+        duration_ms = round((time.perf_counter() - self._start) * 1000)
+        try:
+            self.run = SyncRun.objects.create(
+                job=self.job,
+                trigger=self.trigger,
+                status='failed' if self.failed else 'success',
+                task_id=self.task_id,
+                started_at=self.started_at,
+                finished_at=timezone.now(),
+                duration_ms=duration_ms,
+                phase_timings=self.phase_timings,
+                rows_read=self.rows_read,
+                rows_written=self.rows_written,
+                rows_skipped=self.rows_skipped,
+                api_calls=self.api_calls,
+                retries=self.retries,
+                error_count=self.error_count,
+                errors=self.errors,
+            )
+        except Exception as e:
+            # Instrumentation must never break the run it measures
+            logger.error(f"Failed to record {self.job} run: {e}")
+        return self.run
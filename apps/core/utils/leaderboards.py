@@ -0,0 +1,56 @@
+import heapq
+from django.conf import settings
+from apps.core.models import Stock
+from .cache import cached_compute, store
+
+LEADERBOARDS_KEY = 'stocks:leaderboards'
+
+# Board name -> (field, sign). Stocks rank by field * sign, highest first,
+# and only enter a board with a positive score: a gainer has risen, a loser
+# has fallen, and a stock without a volume or price is left out
+BOARDS = {
+    'gainers': ('change_percent', 1),
+    'losers': ('change_percent', -1),
+    'most_active': ('volume', 1),
+    'highest_price': ('current_price', 1),
+}
+
+FIELDS = ['id', 'symbol', 'name', 'current_price', 'change_percent', 'volume']
+
+
+def compute_leaderboards(size=None):
+    """Top ``size`` active stocks of every board, from one pass over the stock table.
+
+    Each board keeps a min-heap of its best ``size`` rows so far, so the pass
+    costs O(n log size) and never sorts the whole table.
+    """
+    size = size or settings.LEADERBOARD_SIZE
+    heaps = {name: [] for name in BOARDS}
+    rows = Stock.objects.filter(is_active=True).values(*FIELDS)
+    for row in rows.iterator(chunk_size=2000):
+        for name, (field, sign) in BOARDS.items():
+            if row[field] is None:
+                continue
+            score = row[field] * sign
+            if score <= 0:
+                continue
+            # Ties go to the lower id; ids are unique so rows are never compared
+            item = (score, -row['id'], row)
+            heap = heaps[name]
+            if len(heap) < size:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return {name: [row for _, _, row in sorted(heap, reverse=True)] for name, heap in heaps.items()}
+
+
+def refresh_leaderboards():
+    """Recompute the boards after a price sync so page loads never do"""
+    boards = compute_leaderboards()
+    store(LEADERBOARDS_KEY, settings.LEADERBOARDS_TTL, boards)
+    return boards
+
+
+def leaderboards():
+    """The boards as of the last price sync; computed here only if the cache lost them"""
+    return cached_compute(LEADERBOARDS_KEY, settings.LEADERBOARDS_TTL, compute_leaderboards)
@@ -0,0 +1,224 @@
+from collections import defaultdict
+from decimal import ROUND_DOWN, Decimal
+import numpy as np
+from django.db import connections, router, transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+from apps.payments.models import Deposit
+from apps.portfolio.models import Holding, Lot, Trade, valuations_cache_key
+from .cache import bump_data_version, invalidate
+
+CENT = Decimal('0.01')
+SHARE = Decimal('0.0001')
+
+# Backends with INSERT ... ON CONFLICT DO UPDATE, and the float type their
+# average price division is cast to
+UPSERT_FLOAT_TYPES = {'postgresql': 'double precision', 'sqlite': 'REAL'}
+
+
+def _apply(holding_id, quantity, cost):
+    """Add ``quantity`` shares costing ``cost`` to a holding (negative to remove them) in one UPDATE.
+
+    The right-hand sides all see the row as it was before the update, so
+    concurrent trades on the same holding never overwrite each other.
+    """
+    new_quantity = F('quantity') + quantity
+    new_cost = F('cost_basis') + cost
+    Holding.objects.filter(pk=holding_id).update(
+        quantity=new_quantity,
+        cost_basis=new_cost,
+        average_buy_price=Case(
+            When(quantity=-quantity, then=Value(Decimal(0))),
+            # SQLite stores whole-number decimals as integers and would divide them as such
+            default=ExpressionWrapper(Cast(new_cost, FloatField()) / new_quantity, output_field=DecimalField()),
+        ),
+    )
+
+
+def _upsert_holdings(positions):
+    """Add shares to holdings, creating any that do not exist, in one INSERT ... ON CONFLICT DO UPDATE.
+
+    ``positions`` maps ``(portfolio_id, stock_id)`` to ``(quantity, cost)``.
+    The increments are applied by the database against the row as stored,
+    so concurrent buys of the same holding all land. Returns the holding id
+    of each position.
+    """
+    connection = connections[router.db_for_write(Holding)]
+    float_type = UPSERT_FLOAT_TYPES.get(connection.vendor)
+    if float_type is None or not connection.features.can_return_rows_from_bulk_insert:
+        ids = {}
+        for (portfolio_id, stock_id), (quantity, cost) in positions.items():
+            # get_or_create recovers from a concurrent insert of the same holding
+            holding, _ = Holding.objects.get_or_create(
+                portfolio_id=portfolio_id, stock_id=stock_id,
+                defaults={'quantity': 0, 'average_buy_price': 0},
+            )
+            _apply(holding.pk, quantity, cost)
+            ids[portfolio_id, stock_id] = holding.pk
+        return ids
+
+    table = connection.ops.quote_name(Holding._meta.db_table)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = []
+    params = []
+    for (portfolio_id, stock_id), (quantity, cost) in positions.items():
+        rows.append('(%s, %s, %s, %s, %s, %s, %s)')
+        params += [now, now, portfolio_id, stock_id, quantity, (cost / quantity).quantize(CENT), cost]
+    sql = f"""
+        INSERT INTO {table} (created_at, updated_at, portfolio_id, stock_id, quantity, average_buy_price, cost_basis)
+        VALUES {', '.join(rows)}
+        ON CONFLICT (portfolio_id, stock_id) DO UPDATE SET
+            quantity = {table}.quantity + EXCLUDED.quantity,
+            cost_basis = {table}.cost_basis + EXCLUDED.cost_basis,
+            average_buy_price = CAST({table}.cost_basis + EXCLUDED.cost_basis AS {float_type})
+                / ({table}.quantity + EXCLUDED.quantity),
+            updated_at = EXCLUDED.updated_at
+        RETURNING id, portfolio_id, stock_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {(portfolio_id, stock_id): holding_id for holding_id, portfolio_id, stock_id in cursor.fetchall()}
+
+
+def _open_lots(buys, executed_at):
+    """Record ``(holding_id, quantity, price)`` buys as trades, each opening a lot"""
+    trades = Trade.objects.bulk_create([
+        Trade(holding_id=holding_id, side='buy', quantity=quantity, price=price, executed_at=executed_at)
+        for holding_id, quantity, price in buys
+    ])
+    Lot.objects.bulk_create([
+        Lot(
+            holding_id=trade.holding_id, trade=trade, quantity=trade.quantity, remaining=trade.quantity,
+            price=trade.price, acquired_at=executed_at,
+        )
+        for trade in trades
+    ])
+    return trades
+
+
+def record_buy(portfolio, stock, quantity, price):
+    """Buy ``quantity`` shares of ``stock`` at ``price``, opening a lot. Returns the Trade."""
+    with transaction.atomic():
+        holding_id = _upsert_holdings({(portfolio.pk, stock.pk): (quantity, quantity * price)})[portfolio.pk, stock.pk]
+        trade, = _open_lots([(holding_id, quantity, price)], timezone.now())
+    # The upsert skips Holding.save()
+    bump_data_version(portfolio.user_id)
+    return trade
+
+
+def record_sell(holding, quantity, price):
+    """Sell ``quantity`` shares of ``holding`` at ``price``, using up its oldest lots first.
+
+    The cost basis drops by what the consumed lots cost, so it stays the
+    FIFO cost of the shares still held. Raises ValueError when more shares
+    are sold than held. Returns the Trade.
+    """
+    with transaction.atomic():
+        # Locks the holding, so two sells cannot consume the same lots
+        held = Holding.objects.select_for_update().values_list('quantity', flat=True).get(pk=holding.pk)
+        if quantity > held:
+            raise ValueError(f'Only {held.normalize():f} shares of {holding.stock.symbol} are held')
+        trade = Trade.objects.create(holding=holding, side='sell', quantity=quantity, price=price)
+
+        to_sell = quantity
+        consumed_cost = Decimal(0)
+        used_up = []
+        open_lots = holding.lots.filter(remaining__gt=0).order_by('acquired_at', 'id')
+        for lot_id, remaining, lot_price in open_lots.values_list('id', 'remaining', 'price').iterator():
+            take = min(remaining, to_sell)
+            consumed_cost += take * lot_price
+            to_sell -= take
+            if take == remaining:
+                used_up.append(lot_id)
+            else:
+                Lot.objects.filter(pk=lot_id).update(remaining=F('remaining') - take)
+            if not to_sell:
+                break
+        Lot.objects.filter(pk__in=used_up).update(remaining=0)
+        _apply(holding.pk, -quantity, -consumed_cost)
+    bump_data_version(holding.portfolio.user_id)
+    return trade
+
+
+def allocate_deposits(deposits):
+    """Buy shares at the current quote for the completed stock deposits in ``deposits`` not yet allocated.
+
+    ``deposits`` is a Deposit queryset; a whole batch is allocated with one
+    upsert of the holdings it touches. Each deposit is claimed by locking
+    its row, so concurrent completions (the Celery worker, the admin and
+    the sheets webhook) never allocate one twice. Returns how many deposits
+    were allocated.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # The conditions sit on the locked rows themselves, so PostgreSQL rechecks
+        # them against a deposit allocated by a transaction that committed first
+        claimed = list(
+            deposits.select_for_update(skip_locked=True, of=('self',))
+            .filter(status='completed', stock__isnull=False, allocated_at__isnull=True, stock__current_price__gt=0)
+            .values_list('id', 'user_id', 'portfolio_id', 'stock_id', 'amount', 'stock__current_price')
+        )
+        if not claimed:
+            return 0
+
+        allocations = []
+        positions = defaultdict(lambda: [Decimal(0), Decimal(0)])
+        for deposit_id, user_id, portfolio_id, stock_id, amount, price in claimed:
+            quantity = (amount / price).quantize(SHARE, rounding=ROUND_DOWN)
+            allocations.append(Deposit(
+                pk=deposit_id, allocated_at=now, allocated_quantity=quantity, allocation_price=price,
+            ))
+            if quantity:
+                positions[portfolio_id, stock_id][0] += quantity
+                positions[portfolio_id, stock_id][1] += quantity * price
+
+        if positions:
+            holding_ids = _upsert_holdings({key: tuple(value) for key, value in positions.items()})
+            _open_lots([
+                (holding_ids[portfolio_id, stock_id], allocation.allocated_quantity, allocation.allocation_price)
+                for allocation, (_, _, portfolio_id, stock_id, _, _) in zip(allocations, claimed)
+                if allocation.allocated_quantity
+            ], now)
+        Deposit.objects.bulk_update(allocations, ['allocated_at', 'allocated_quantity', 'allocation_price'])
+
+    for user_id in {row[1] for row in claimed}:
+        invalidate(valuations_cache_key(user_id))
+        bump_data_version(user_id)
+    return len(claimed)
+
+
+def realized_gains(trades):
+    """Profit of each sell in ``trades`` (one holding's, in execution order), matching buys first in, first out.
+
+    Nothing about it is stored; it is worked out from the ledger when asked
+    for. Sells use up the shares in the order they were bought, so the
+    shares the first n sold were the first n bought, and what they cost is
+    read off the cumulative cost curve of the buys. That is one vectorized
+    pass instead of walking lot by lot. Returns ``(rows, total)`` with one
+    row per sell.
+    """
+    sells = [trade for trade in trades if trade.side == 'sell']
+    if not sells:
+        return [], Decimal(0)
+    is_sell = np.fromiter((trade.side == 'sell' for trade in trades), dtype=bool, count=len(trades))
+    quantity = np.fromiter((trade.quantity for trade in trades), dtype=float, count=len(trades))
+    price = np.fromiter((trade.price for trade in trades), dtype=float, count=len(trades))
+
+    # Cumulative shares bought against their cumulative cost, starting at zero
+    bought = np.concatenate(([0.0], np.cumsum(quantity[~is_sell])))
+    spent = np.concatenate(([0.0], np.cumsum(quantity[~is_sell] * price[~is_sell])))
+    sold = np.concatenate(([0.0], np.cumsum(quantity[is_sell])))
+    cost = np.diff(np.interp(sold, bought, spent))
+    proceeds = quantity[is_sell] * price[is_sell]
+
+    rows = [
+        {
+            'trade': trade,
+            'cost': Decimal(repr(c)).quantize(CENT),
+            'proceeds': Decimal(repr(p)).quantize(CENT),
+            'gain': Decimal(repr(p - c)).quantize(CENT),
+        }
+        for trade, c, p in zip(sells, cost.tolist(), proceeds.tolist())
+    ]
+    return rows, Decimal(repr(float((proceeds - cost).sum()))).quantize(CENT)
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import logging
+import redis
+import redis.asyncio
+from django.conf import settings
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before resubscribing after the Redis connection drops
+RECONNECT_DELAY = 5
+
+# Quote batches buffered per browser; a slower client drops the oldest ones
+SUBSCRIBER_QUEUE_SIZE = 20
+
+
+def quote_payload(stock):
+    """JSON-safe quote for one stock, as pushed to the browser"""
+    return {
+        'symbol': stock.symbol,
+        'price': float(stock.current_price),
+        'previous_close': float(stock.previous_close) if stock.previous_close is not None else None,
+        'change_percent': float(stock.change_percent) if stock.change_percent is not None else None,
+        'updated': stock.last_updated.isoformat() if stock.last_updated else None,
+    }
+
+
+def publish_quotes(stocks):
+    """Publish changed quotes in a single message; returns the receiver count.
+
+    Live updates are best effort, so a Redis outage is logged and never
+    fails the price sync that called this.
+    """
+    quotes = [quote_payload(stock) for stock in stocks]
+    if not quotes:
+        return 0
+    try:
+        return get_redis().publish(settings.PRICE_CHANNEL, json.dumps(quotes))
+    except redis.RedisError as e:
+        logger.warning(f'⚠️ Could not publish {len(quotes)} live quotes: {e}')
+        return 0
+
+
+class Subscription:
+    def __init__(self, symbols):
+        self.symbols = frozenset(symbols)
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, quotes):
+        if self.symbols:
+            quotes = [quote for quote in quotes if quote['symbol'] in self.symbols]
+        if not quotes:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(quotes)
+
+
+class PriceBroadcaster:
+    """Fan the price channel out to every stream open in this process.
+
+    One Redis subscription per worker, however many browsers are connected.
+    The listener starts with the first subscriber and stops with the last.
+    """
+
+    def __init__(self):
+        self.subscriptions = set()
+        self._listener = None
+
+    def subscribe(self, symbols=()):
+        subscription = Subscription(symbols)
+        self.subscriptions.add(subscription)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions and self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    def dispatch(self, quotes):
+        for subscription in list(self.subscriptions):
+            subscription.offer(quotes)
+
+    async def _listen(self):
+        while True:
+            client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+            try:
+                async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(settings.PRICE_CHANNEL)
+                    async for message in pubsub.listen():
+                        try:
+                            self.dispatch(json.loads(message['data']))
+                        except (TypeError, ValueError) as e:
+                            logger.warning(f'⚠️ Ignoring malformed live quote message: {e}')
+            except redis.RedisError as e:
+                logger.warning(f'⚠️ Live price subscription lost, retrying in {RECONNECT_DELAY}s: {e}')
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                await client.aclose()
+
+
+broadcaster = PriceBroadcaster()
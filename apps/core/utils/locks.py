@@ -0,0 +1,200 @@
+import hashlib
+import threading
+import uuid
+import logging
+import redis
+from django.conf import settings
+from django.db import connection
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Only touch the lock if we still own it
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Release the lock and pop the rerun requests queued since the last take in
+# one step, so no request can land between the two
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    local members = redis.call('SMEMBERS', KEYS[2])
+    redis.call('DEL', KEYS[2])
+    return members
+end
+return {}
+"""
+
+# Queue rerun requests only while someone holds the lock to run them
+QUEUE_RERUN_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('SADD', KEYS[2], unpack(ARGV, 2))
+    redis.call('PEXPIRE', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# Read and clear the queued rerun requests in one step
+TAKE_RERUNS_SCRIPT = """
+local members = redis.call('SMEMBERS', KEYS[1])
+redis.call('DEL', KEYS[1])
+return members
+"""
+
+
+class JobLock:
+    """Cluster-wide lock guaranteeing a single running instance of a job.
+
+    Backed by a Redis key with a TTL that a heartbeat thread keeps extending
+    while the job runs, so a crashed holder frees the lock within ``ttl``
+    seconds. When Redis is unreachable it falls back to a PostgreSQL
+    session advisory lock (released when the connection closes); on other
+    databases the job runs unguarded with a warning.
+
+    Triggers that find the lock taken can ``request_rerun()``; the holder
+    collects those requests with ``take_rerun_requests()`` when it finishes,
+    so any number of overlapping triggers coalesce into one follow-up run.
+    ``release()`` returns the requests that arrived after the holder's last
+    take; ``run_coalesced()`` wraps the whole protocol.
+    """
+
+    def __init__(self, name, ttl=None):
+        self.name = name
+        self.key = f'joblock:{name}'
+        self.rerun_key = f'joblock:{name}:rerun'
+        self.ttl = ttl or settings.JOB_LOCK_TTL
+        self.token = uuid.uuid4().hex
+        self.backend = None
+        self.acquired = False
+        self.lost = False
+        self.released_reruns = set()
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def acquire(self):
+        self.lost = False
+        try:
+            acquired = bool(get_redis().set(self.key, self.token, nx=True, px=int(self.ttl * 1000)))
+            if acquired:
+                self.backend = 'redis'
+                self._start_heartbeat()
+            return acquired
+        except redis.RedisError as e:
+            logger.warning(f"Job lock '{self.name}' cannot reach Redis: {e}")
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [self._advisory_key()])
+                acquired = cursor.fetchone()[0]
+            if acquired:
+                self.backend = 'postgresql'
+            return acquired
+
+        logger.warning(f"Job lock '{self.name}' unavailable, running without a lock")
+        return True
+
+    def release(self):
+        """Release the lock; returns the rerun requests queued since the last take"""
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join(timeout=5)
+        reruns = set()
+        try:
+            if self.backend == 'redis':
+                reruns = _decode(get_redis().eval(RELEASE_SCRIPT, 2, self.key, self.rerun_key, self.token))
+            elif self.backend == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [self._advisory_key()])
+        except Exception as e:
+            logger.error(f"Failed to release job lock '{self.name}': {e}")
+        self.backend = None
+        return reruns
+
+    def request_rerun(self, *payloads):
+        """Ask the current holder to run once more when it finishes.
+
+        Returns True when the request was queued. If the holder released the
+        lock since ``acquire()`` failed, nobody would pick the request up, so
+        the lock is taken here instead (check ``acquired``) and False returned;
+        False with ``acquired`` unset means nothing was queued at all.
+        """
+        try:
+            queued = get_redis().eval(
+                QUEUE_RERUN_SCRIPT, 2, self.key, self.rerun_key, int(self.ttl * 1000), *(payloads or ('run',))
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Could not queue rerun of '{self.name}': {e}")
+            return False
+        if not queued:
+            self.acquired = self.acquire()
+        return bool(queued)
+
+    def take_rerun_requests(self):
+        """Pop every queued rerun request"""
+        try:
+            return _decode(get_redis().eval(TAKE_RERUNS_SCRIPT, 1, self.rerun_key))
+        except redis.RedisError:
+            return set()
+
+    def run_coalesced(self, job, payload='run', max_runs=1):
+        """Run ``job`` under the lock, or queue ``payload`` for the current holder.
+
+        ``job`` is called with the set of payloads each run covers: the
+        caller's own first, then every batch queued while it ran, including
+        requests that raced the release. At most ``max_runs`` runs happen.
+        Returns 'ran', 'queued' or 'skipped' (the lock was held and the
+        request could not be queued).
+        """
+        pending = {payload}
+        runs = 0
+        while pending and runs < max_runs:
+            with self:
+                if not self.acquired and self.request_rerun(*pending):
+                    return 'queued' if not runs else 'ran'
+                if not self.acquired:
+                    return 'skipped' if not runs else 'ran'
+                while pending and runs < max_runs and not self.lost:
+                    job(pending)
+                    runs += 1
+                    pending = self.take_rerun_requests()
+            pending |= self.released_reruns
+        if pending:
+            logger.warning(f"Dropped {len(pending)} rerun requests of '{self.name}' after {runs} runs")
+        return 'ran'
+
+    def _advisory_key(self):
+        return int.from_bytes(hashlib.sha1(self.key.encode()).digest()[:8], 'big', signed=True)
+
+    def _start_heartbeat(self):
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, name=f'joblock-{self.name}', daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                if not get_redis().eval(EXTEND_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000)):
+                    self.lost = True
+                    logger.error(f"Job lock '{self.name}' was lost before the job finished")
+                    return
+            except redis.RedisError as e:
+                logger.warning(f"Job lock '{self.name}' heartbeat failed: {e}")
+
+    def __enter__(self):
+        self.acquired = self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.released_reruns = set()
+        if self.acquired:
+            self.released_reruns = self.release()
+        return False
+
+
+def _decode(members):
+    return {member.decode() if isinstance(member, bytes) else member for member in members}
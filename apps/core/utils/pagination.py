@@ -0,0 +1,244 @@
+import base64
+import json
+import logging
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.http import Http404
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keyset):
+    """The values of ``keyset``'s fields encoded in ``cursor``; 404s on any cursor not built by us"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise Http404('Invalid page cursor')
+    if not isinstance(values, list) or len(values) != len(keyset.fields):
+        raise Http404('Invalid page cursor')
+    try:
+        return [keyset.to_python(name, value) for (name, _), value in zip(keyset.fields, values)]
+    except (ValidationError, TypeError, ValueError):
+        raise Http404('Invalid page cursor')
+
+
+def estimated_count(queryset):
+    """Row count of ``queryset``, from the planner's estimate where it is large.
+
+    PostgreSQL reports the rows it expects the query to return from its
+    table statistics, without reading them. Estimates below
+    ESTIMATED_COUNT_THRESHOLD, and every count on other databases, are
+    exact COUNT(*) queries. Returns ``(count, is_estimate)``.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        try:
+            plan = json.loads(queryset.explain(format='json'))
+            rows = int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.warning(f'⚠️ Could not estimate row count, counting instead: {e}')
+        else:
+            if rows >= settings.ESTIMATED_COUNT_THRESHOLD:
+                return rows, True
+    return queryset.count(), False
+
+
+class Keyset:
+    """An ordering by one or more fields, ending in a unique one, that rows can be sought in.
+
+    ``fields`` are names as given to ``order_by()`` (``'-created_at'``). A
+    nullable field sorts its NULLs after every value in ascending order and
+    before them in descending order, consistently with the seek condition.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in fields]
+
+    def _field(self, name):
+        if name == 'pk':
+            return self.model._meta.pk
+        try:
+            return self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation, such as a search rank
+            return None
+
+    def _nullable(self, name):
+        field = self._field(name)
+        # Annotations are never NULL
+        return field is not None and name != 'pk' and field.null
+
+    def to_python(self, name, value):
+        """A cursor value as ``name``'s field type; raises ValidationError or TypeError if it is not one"""
+        if value is None:
+            if not self._nullable(name):
+                raise TypeError(f'{name} cannot be null')
+            return None
+        field = self._field(name)
+        if field is None:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise TypeError(f'{name} must be a number')
+            return value
+        return field.to_python(value)
+
+    def ordering(self, reverse=False):
+        orderings = []
+        for name, descending in self.fields:
+            descending ^= reverse
+            if not self._nullable(name):
+                orderings.append(F(name).desc() if descending else F(name).asc())
+            elif descending:
+                orderings.append(F(name).desc(nulls_first=True))
+            else:
+                orderings.append(F(name).asc(nulls_last=True))
+        return orderings
+
+    def values(self, obj):
+        return [getattr(obj, name) for name, _ in self.fields]
+
+    def _beyond(self, name, descending, value):
+        """Rows strictly past ``value`` in this field's direction, or None if there are none"""
+        if not self._nullable(name):
+            return Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+        if descending:
+            # NULLs come first, so everything non-null follows them
+            return Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__lt': value})
+        if value is None:
+            return None
+        return Q(**{f'{name}__gt': value}) | Q(**{f'{name}__isnull': True})
+
+    def _equal(self, name, value):
+        return Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+    def after(self, values, reverse=False):
+        """Filter for rows that follow ``values`` (precede them when ``reverse``)"""
+        condition = Q(pk__in=[])
+        prefix = Q()
+        for (name, descending), value in zip(self.fields, values):
+            beyond = self._beyond(name, descending ^ reverse, value)
+            if beyond is not None:
+                condition |= prefix & beyond
+            prefix &= self._equal(name, value)
+        name, descending = self.fields[0]
+        if not self._nullable(name):
+            # A plain range on the leading field lets the index seek straight to the cursor
+            lookup = 'lte' if descending ^ reverse else 'gte'
+            condition &= Q(**{f'{name}__{lookup}': values[0]})
+        return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous, query_params):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self._query_params = query_params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _url(self, key, obj):
+        params = self._query_params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[key] = encode_cursor(self.paginator.keyset.values(obj))
+        return f'?{params.urlencode()}'
+
+    @property
+    def next_url(self):
+        return self._url('after', self.object_list[-1]) if self._has_next else None
+
+    @property
+    def previous_url(self):
+        return self._url('before', self.object_list[0]) if self._has_previous else None
+
+    @property
+    def first_url(self):
+        params = self._query_params.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        return f'?{params.urlencode()}'
+
+
+class KeysetPaginator:
+    """Pages a queryset by seeking past the last row shown instead of OFFSET.
+
+    Every page costs one indexed range scan of ``per_page + 1`` rows, however
+    deep it is. The total is only counted when ``count_rows`` is set, and
+    then possibly estimated (see estimated_count()).
+    """
+
+    def __init__(self, queryset, per_page, keyset, count_rows=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keyset = Keyset(queryset.model, keyset)
+        self.count_rows = count_rows
+        self._count = None
+
+    def _counted(self):
+        if self._count is None:
+            self._count = estimated_count(self.queryset.order_by())
+        return self._count
+
+    @property
+    def count(self):
+        return self._counted()[0] if self.count_rows else None
+
+    @property
+    def count_is_estimate(self):
+        return self._counted()[1] if self.count_rows else False
+
+    def page(self, query_params):
+        after, before = query_params.get('after'), query_params.get('before')
+        reverse = bool(before) and not after
+        queryset = self.queryset.order_by(*self.keyset.ordering(reverse))
+        cursor = after or before
+        if cursor:
+            queryset = queryset.filter(self.keyset.after(decode_cursor(cursor, self.keyset), reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=more, query_params=query_params)
+        return KeysetPage(rows, self, has_next=more, has_previous=bool(after), query_params=query_params)
+
+
+class KeysetPaginationMixin:
+    """ListView pagination with ?after= / ?before= cursors over ``get_keyset()``.
+
+    The page object offers next_url, previous_url and first_url, which keep
+    the other query parameters (search, sort) of the current request.
+    """
+    keyset = ['pk']
+    count_rows = False
+
+    def get_keyset(self):
+        return self.keyset
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset(), count_rows=self.count_rows)
+        page = paginator.page(self.request.GET)
+        return paginator, page, page.object_list, page.has_other_pages()
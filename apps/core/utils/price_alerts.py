@@ -0,0 +1,154 @@
+import bisect
+import logging
+import threading
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from apps.core.models import PriceAlert, Stock
+from .cache import alerts_version, bump_alerts_version
+
+logger = logging.getLogger(__name__)
+
+
+class AlertIndex:
+    """Every stock's active alert thresholds in a sorted array, searched by bisection.
+
+    Built from one ordered query over the active alerts; finding the alerts
+    a price move triggers is then two binary searches on that stock's array
+    plus a slice, however many alerts it has.
+    """
+
+    def __init__(self, rows):
+        self.thresholds = {}
+        self.ids = {}
+        # Rows arrive ordered by (stock, threshold), so every array is sorted
+        for stock_id, threshold, alert_id in rows:
+            self.thresholds.setdefault(stock_id, []).append(threshold)
+            self.ids.setdefault(stock_id, []).append(alert_id)
+
+    def crossed(self, stock_id, old, new):
+        """Alerts of ``stock_id`` that a move from ``old`` to ``new`` reaches or passes"""
+        thresholds = self.thresholds.get(stock_id)
+        if not thresholds or old == new:
+            return []
+        if old < new:
+            # old < threshold <= new
+            start = bisect.bisect_right(thresholds, old)
+            end = bisect.bisect_right(thresholds, new, start)
+        else:
+            # new <= threshold < old
+            start = bisect.bisect_left(thresholds, new)
+            end = bisect.bisect_left(thresholds, old, start)
+        return self.ids[stock_id][start:end]
+
+
+class AlertBook:
+    """Process-wide AlertIndex, rebuilt when an alert is added, removed or triggered.
+
+    The alerts version only reaches other processes through a shared cache.
+    With a process-local one (LocMem, dummy) the web process's bumps never
+    reach the worker evaluating alerts, and without the cache there is no
+    version at all, so in both cases the index is rebuilt on every
+    evaluation rather than risk missing a new alert. It is also rebuilt
+    once older than PRICE_ALERT_INDEX_MAX_AGE seconds, in case a bump was
+    lost.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stale(self, version):
+        return (
+            self._index is None
+            or version is None
+            or version != self._version
+            or not _shared_cache()
+            or time.monotonic() - self._built_at > settings.PRICE_ALERT_INDEX_MAX_AGE
+        )
+
+    def index(self):
+        version = alerts_version()
+        with self._lock:
+            if self._stale(version):
+                self._index = AlertIndex(build_rows())
+                self._version = version
+                self._built_at = time.monotonic()
+            return self._index
+
+
+def _shared_cache():
+    """Whether cache writes are seen by other processes"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def build_rows():
+    return (
+        PriceAlert.objects.filter(is_active=True)
+        .order_by('stock_id', 'threshold', 'id')
+        .values_list('stock_id', 'threshold', 'id')
+    )
+
+
+alert_book = AlertBook()
+
+
+def _price(value):
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def evaluate_price_alerts(moves):
+    """Trigger the alerts crossed by ``moves``, a ``{stock_id: (old_price, new_price)}`` dict.
+
+    Triggered alerts are deactivated, stamped with the stock's new price and
+    queued for notification in batches of PRICE_ALERT_BATCH_SIZE. A stock
+    without an old price (just created) triggers nothing. Returns how many
+    alerts were triggered.
+    """
+    index = alert_book.index()
+    candidates = []
+    for stock_id, (old, new) in moves.items():
+        if old is not None and new is not None:
+            candidates.extend(index.crossed(stock_id, _price(old), _price(new)))
+    if not candidates:
+        return 0
+
+    triggered = 0
+    size = settings.PRICE_ALERT_BATCH_SIZE
+    for start in range(0, len(candidates), size):
+        batch = candidates[start:start + size]
+        with transaction.atomic():
+            # Another evaluator working from the same index may have claimed some already
+            claimed = list(
+                PriceAlert.objects.select_for_update(skip_locked=True)
+                .filter(id__in=batch, is_active=True)
+                .values_list('id', flat=True)
+            )
+            PriceAlert.objects.filter(id__in=claimed).update(
+                is_active=False,
+                triggered_at=timezone.now(),
+                triggered_price=Subquery(Stock.objects.filter(pk=OuterRef('stock_id')).values('current_price')[:1]),
+            )
+        if claimed:
+            triggered += len(claimed)
+            _enqueue(claimed)
+    bump_alerts_version()
+    logger.info(f'Triggered {triggered} price alerts')
+    return triggered
+
+
+def _enqueue(alert_ids):
+    from apps.core.tasks import send_price_alerts
+    try:
+        send_price_alerts.delay(alert_ids)
+    except Exception as e:
+        # They stay triggered with notified_at unset; send_price_alerts picks them up later
+        logger.warning(f'⚠️ Could not queue notifications for {len(alert_ids)} price alerts: {e}')
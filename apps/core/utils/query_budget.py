@@ -0,0 +1,100 @@
+import re
+from collections import Counter
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Literals and IN-lists vary between otherwise identical queries
+_IN_LIST = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    """Normalise SQL so queries differing only in parameters compare equal"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def get_query_budget(view_name, method='GET'):
+    """Declared query budget for a URL name, or QUERY_BUDGET_DEFAULT.
+    
+    POSTs use QUERY_BUDGETS_POST where the route declares one there.
+    """
+    if method == 'POST' and view_name in settings.QUERY_BUDGETS_POST:
+        return settings.QUERY_BUDGETS_POST[view_name]
+    return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# Recorders active in the current context. A context variable rather than a
+# per-connection wrapper, because async views run their queries on worker
+# threads that each hold their own connection objects.
+_active_recorders = ContextVar('active_query_recorders', default=())
+
+
+def _record_query(execute, sql, params, many, context):
+    for recorder in _active_recorders.get():
+        if recorder.using == context['connection'].alias:
+            recorder.queries.append(sql)
+    return execute(sql, params, many, context)
+
+
+def install_query_recording(sender, connection, **kwargs):
+    """connection_created handler adding the recording execute wrapper"""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class QueryRecorder:
+    """Record every query run on a database while the block is active.
+
+    Works without DEBUG, across sync_to_async threads, and nests freely::
+
+        with QueryRecorder() as recorder:
+            client.get('/dashboard/')
+        recorder.check(budget=8)
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.queries = []
+
+    def __enter__(self):
+        self._token = _active_recorders.set(_active_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_recorders.reset(self._token)
+        return False
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated_shapes(self, threshold=None):
+        """Query shapes run at least ``threshold`` times - the N+1 signature"""
+        threshold = threshold or settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        counts = Counter(query_shape(sql) for sql in self.queries)
+        return {shape: n for shape, n in counts.items() if n >= threshold}
+
+    def problems(self, budget, threshold=None):
+        """Human-readable budget and N+1 violations, empty when within budget"""
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} queries (budget {budget})')
+        for shape, n in self.repeated_shapes(threshold).items():
+            problems.append(f'{n}x {shape[:200]}')
+        return problems
+
+    def check(self, budget, threshold=None, label='block'):
+        """Raise QueryBudgetExceeded if the recorded queries break the budget"""
+        problems = self.problems(budget, threshold)
+        if problems:
+            raise QueryBudgetExceeded(f'{label}: ' + '; '.join(problems))
@@ -0,0 +1,117 @@
+import random
+import threading
+import time
+import logging
+import redis
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Reserve one token from a shared bucket and return how long the caller must
+# wait before using it. The bucket may go negative so that concurrent callers
+# queue up behind each other instead of retrying in lockstep.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+REDIS_RETRY_INTERVAL = 30
+
+
+class TokenBucket:
+    """Token bucket shared by every process through Redis.
+
+    ``rate_per_minute`` tokens are added per minute up to a burst of the same
+    size. If Redis is unreachable the bucket degrades to a per-process one.
+    """
+
+    def __init__(self, name, rate_per_minute):
+        self.key = f'ratelimit:{name}'
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self._lock = threading.Lock()
+        self._tokens = float(self.capacity)
+        self._ts = time.monotonic()
+        self._script = None
+        self._redis_retry_at = 0.0
+
+    def reserve(self):
+        """Take one token and return the seconds to wait before using it"""
+        if time.monotonic() >= self._redis_retry_at:
+            try:
+                if self._script is None:
+                    self._script = get_redis().register_script(TOKEN_BUCKET_SCRIPT)
+                return float(self._script(keys=[self.key], args=[self.rate, self.capacity]))
+            except redis.RedisError as e:
+                # Don't pay a connection timeout on every call while Redis is down
+                self._redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+                logger.warning(f"Rate limiter falling back to process-local bucket: {e}")
+        return self._reserve_local()
+
+    def _reserve_local(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate) - 1
+            self._ts = now
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """Block until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def is_rate_limit_error(exc):
+    """True for Google API quota errors (HTTP 429 / RESOURCE_EXHAUSTED)"""
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(exc, 'code', None)
+    return status == 429 or 'RESOURCE_EXHAUSTED' in str(exc)
+
+
+def backoff_delay(attempt, base, cap):
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class RequestScheduler:
+    """Paces outbound calls through a TokenBucket and retries rate-limited ones"""
+
+    def __init__(self, bucket, max_retries=5, backoff_base=1.0, backoff_max=64.0):
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.throttled_seconds += self.bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                logger.warning(
+                    f"Rate limited by Google Sheets, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+                self.throttled_seconds += delay
+                self.retries += 1
+                attempt += 1
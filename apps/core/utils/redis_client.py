@@ -0,0 +1,20 @@
+import redis
+from django.conf import settings
+
+_connection = None
+
+def get_redis():
+    """Shared Redis connection for cross-process coordination.
+
+    Connection problems surface as ``redis.RedisError`` when a command runs,
+    so callers can fall back to process-local behaviour.
+    """
+    global _connection
+    if _connection is None:
+        _connection = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=2,
+            socket_connect_timeout=2,
+            health_check_interval=30,
+        )
+    return _connection
@@ -0,0 +1,264 @@
+import csv
+import json
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import gspread
+from django.conf import settings
+from django.utils.module_loading import import_string
+from oauth2client.service_account import ServiceAccountCredentials
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SheetBackend:
+    """Storage behind GoogleSheetsClient.
+
+    ``open(sheet_id)`` returns a spreadsheet object exposing the subset of the
+    gspread API the client relies on: ``worksheet(title)``,
+    ``get_worksheet(index)`` and ``add_worksheet(title, rows, cols)``.
+    Backends with ``rate_limited = True`` have their calls paced against the
+    shared Sheets API quota.
+    """
+
+    rate_limited = False
+
+    def open(self, sheet_id):
+        raise NotImplementedError
+
+
+class GspreadBackend(SheetBackend):
+    """Live Google Sheets through gspread"""
+
+    rate_limited = True
+
+    scope = [
+        "https://spreadsheets.google.com/feeds",
+        "https://www.googleapis.com/auth/drive",
+        "https://www.googleapis.com/auth/spreadsheets"
+    ]
+
+    def open(self, sheet_id):
+        return self._authenticate().open_by_key(sheet_id)
+
+    def _authenticate(self):
+        """Authenticate with Google Sheets API using environment variable"""
+        # Get credentials from environment variable (minified JSON)
+        creds_json = os.environ.get('GOOGLE_SHEETS_CREDENTIALS')
+
+        if not creds_json:
+            # Fallback to environment variable with different name
+            creds_json = os.environ.get('GOOGLE_SHEETS_CREDENTIALS_JSON')
+
+        if creds_json:
+            try:
+                # Parse the JSON string
+                creds_dict = json.loads(creds_json)
+                creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, self.scope)
+                logger.info("✅ Authenticated using GOOGLE_SHEETS_CREDENTIALS environment variable")
+                return gspread.authorize(creds)
+            except json.JSONDecodeError as e:
+                logger.error(f"❌ Failed to parse GOOGLE_SHEETS_CREDENTIALS JSON: {e}")
+                logger.error("Make sure the environment variable contains valid minified JSON")
+                raise Exception(f"Invalid JSON in GOOGLE_SHEETS_CREDENTIALS: {e}")
+            except Exception as e:
+                logger.error(f"❌ Failed to authenticate with credentials from environment: {e}")
+                raise
+
+        # If no environment variable, try credentials.json file (for local development)
+        creds_file = os.path.join(settings.BASE_DIR, 'credentials.json')
+        if os.path.exists(creds_file):
+            try:
+                creds = ServiceAccountCredentials.from_json_keyfile_name(creds_file, self.scope)
+                logger.info("✅ Authenticated using credentials.json file (local development)")
+                return gspread.authorize(creds)
+            except Exception as e:
+                logger.error(f"❌ Failed to authenticate with credentials.json: {e}")
+                raise
+
+        # No credentials found
+        error_msg = (
+            "❌ No Google Sheets credentials found.\n"
+            "Please set GOOGLE_SHEETS_CREDENTIALS environment variable with your minified service account JSON.\n"
+            "For local development, you can also place credentials.json in the project root."
+        )
+        logger.error(error_msg)
+        raise Exception(error_msg)
+
+
+def _numericise(value):
+    """Convert a cell string the way gspread's get_all_records does"""
+    if not isinstance(value, str) or value == '':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class LocalWorksheet:
+    """In-memory worksheet holding rows of cell strings"""
+
+    def __init__(self, title, rows, on_change=None):
+        self.title = title
+        self._rows = [[str(cell) if cell is not None else '' for cell in row] for row in rows]
+        self._on_change = on_change
+
+    @property
+    def row_count(self):
+        return len(self._rows)
+
+    def get_all_values(self):
+        return [list(row) for row in self._rows]
+
+    def get_all_records(self):
+        if not self._rows:
+            return []
+        header = self._rows[0]
+        return [
+            {key: _numericise(row[i] if i < len(row) else '') for i, key in enumerate(header)}
+            for row in self._rows[1:]
+        ]
+
+    def col_values(self, col):
+        return [row[col - 1] if len(row) >= col else '' for row in self._rows]
+
+    def find(self, query):
+        for row_idx, row in enumerate(self._rows, start=1):
+            for col_idx, value in enumerate(row, start=1):
+                if value == query:
+                    return SimpleNamespace(row=row_idx, col=col_idx, value=value)
+        return None
+
+    def append_row(self, values):
+        self.append_rows([values])
+
+    def append_rows(self, values):
+        rows = [[str(cell) if cell is not None else '' for cell in row] for row in values]
+        self._rows.extend(rows)
+        if self._on_change:
+            self._on_change(self, appended=rows)
+
+    def update_cell(self, row, col, value):
+        while len(self._rows) < row:
+            self._rows.append([])
+        cells = self._rows[row - 1]
+        while len(cells) < col:
+            cells.append('')
+        cells[col - 1] = str(value)
+        if self._on_change:
+            self._on_change(self)
+
+
+class LocalSpreadsheet:
+    """Ordered collection of LocalWorksheets standing in for a gspread Spreadsheet"""
+
+    def __init__(self, title, worksheets, on_change=None):
+        self.title = title
+        self._worksheets = list(worksheets)
+        self._on_change = on_change
+
+    def worksheets(self):
+        return list(self._worksheets)
+
+    def worksheet(self, title):
+        for worksheet in self._worksheets:
+            if worksheet.title == title:
+                return worksheet
+        raise gspread.WorksheetNotFound(title)
+
+    def get_worksheet(self, index):
+        try:
+            return self._worksheets[index]
+        except IndexError:
+            raise gspread.WorksheetNotFound(index)
+
+    def add_worksheet(self, title, rows=100, cols=20):
+        worksheet = LocalWorksheet(title, [], on_change=self._on_change)
+        self._worksheets.append(worksheet)
+        if self._on_change:
+            self._on_change(worksheet)
+        return worksheet
+
+
+class LocalFileBackend(SheetBackend):
+    """Sheets stored on disk under GOOGLE_SHEETS_LOCAL_DIR.
+
+    The sheet id names an entry in that directory:
+
+    * ``<sheet_id>/`` - a directory with one ``<worksheet>.csv`` per worksheet.
+      Writes are persisted back to the CSV files.
+    * ``<sheet_id>.xlsx`` - a workbook, one worksheet per tab.
+    * ``<sheet_id>.json`` - a fixture recorded with ``record_sheets_fixture``.
+
+    Workbooks and recorded fixtures are replayed read-only: writes are kept in
+    memory so a benchmark never mutates its inputs.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.GOOGLE_SHEETS_LOCAL_DIR)
+
+    def open(self, sheet_id):
+        base = self.root / sheet_id
+        if base.is_dir():
+            return self._open_csv_dir(base)
+        if base.with_suffix('.xlsx').exists():
+            return self._open_xlsx(base.with_suffix('.xlsx'))
+        if base.with_suffix('.json').exists():
+            return self._open_fixture(base.with_suffix('.json'))
+        raise gspread.SpreadsheetNotFound(f"No local sheet '{sheet_id}' in {self.root}")
+
+    def _open_csv_dir(self, directory):
+        def persist(worksheet, appended=None):
+            path = directory / f'{worksheet.title}.csv'
+            if appended is not None and path.exists():
+                with open(path, 'a', newline='') as f:
+                    csv.writer(f).writerows(appended)
+            else:
+                with open(path, 'w', newline='') as f:
+                    csv.writer(f).writerows(worksheet.get_all_values())
+
+        worksheets = []
+        for path in sorted(directory.glob('*.csv')):
+            with open(path, newline='') as f:
+                worksheets.append(LocalWorksheet(path.stem, list(csv.reader(f)), on_change=persist))
+        return LocalSpreadsheet(directory.name, worksheets, on_change=persist)
+
+    def _open_xlsx(self, path):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        worksheets = [
+            LocalWorksheet(ws.title, ws.iter_rows(values_only=True))
+            for ws in workbook.worksheets
+        ]
+        workbook.close()
+        return LocalSpreadsheet(path.stem, worksheets)
+
+    def _open_fixture(self, path):
+        with open(path) as f:
+            fixture = json.load(f)
+        worksheets = [
+            LocalWorksheet(ws['title'], ws['values'])
+            for ws in fixture['worksheets']
+        ]
+        return LocalSpreadsheet(fixture.get('title', path.stem), worksheets)
+
+
+SHEET_BACKENDS = {
+    'gspread': GspreadBackend,
+    'local': LocalFileBackend,
+}
+
+
+def get_sheet_backend(name=None):
+    """Instantiate the backend named by GOOGLE_SHEETS_BACKEND (or a dotted path)"""
+    name = name or settings.GOOGLE_SHEETS_BACKEND
+    backend_class = SHEET_BACKENDS.get(name) or import_string(name)
+    return backend_class()
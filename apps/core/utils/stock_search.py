@@ -0,0 +1,162 @@
+import logging
+from django.db import connections, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+# Trigram indexes only narrow searches of at least three characters; shorter
+# ones match symbol and name prefixes instead of any substring
+TRIGRAM_MIN_LENGTH = 3
+
+# Sorts after every character a symbol can contain (in SQLite's binary collation)
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+SQLITE_SEARCH_TABLE = 'core_stock_search'
+
+SQLITE_INSTALL = [
+    # External-content FTS5 table: the trigram index only, rows stay in core_stock
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_SEARCH_TABLE}
+        USING fts5(symbol, name, content='core_stock', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_SEARCH_TABLE}_ai AFTER INSERT ON core_stock BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE}(rowid, symbol, name) VALUES (new.id, new.symbol, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_SEARCH_TABLE}_ad AFTER DELETE ON core_stock BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}, rowid, symbol, name)
+        VALUES ('delete', old.id, old.symbol, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_SEARCH_TABLE}_au AFTER UPDATE OF symbol, name ON core_stock BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}, rowid, symbol, name)
+        VALUES ('delete', old.id, old.symbol, old.name);
+        INSERT INTO {SQLITE_SEARCH_TABLE}(rowid, symbol, name) VALUES (new.id, new.symbol, new.name);
+    END""",
+    f"INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    f'DROP TRIGGER IF EXISTS {SQLITE_SEARCH_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {SQLITE_SEARCH_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {SQLITE_SEARCH_TABLE}_au',
+    f'DROP TABLE IF EXISTS {SQLITE_SEARCH_TABLE}',
+]
+
+# Expression indexes matching the UPPER(col::text) LIKE UPPER(...) that
+# Django emits for icontains
+POSTGRESQL_INSTALL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS stock_symbol_trgm_idx ON core_stock USING gin (UPPER(symbol::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS stock_name_trgm_idx ON core_stock USING gin (UPPER(name::text) gin_trgm_ops)',
+]
+
+POSTGRESQL_UNINSTALL = [
+    'DROP INDEX IF EXISTS stock_symbol_trgm_idx',
+    'DROP INDEX IF EXISTS stock_name_trgm_idx',
+]
+
+INSTALL = {'sqlite': SQLITE_INSTALL, 'postgresql': POSTGRESQL_INSTALL}
+UNINSTALL = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRESQL_UNINSTALL}
+
+# Per database alias: whether the SQLite search table exists
+_sqlite_index_ready = {}
+
+
+def install_search_index(connection):
+    """Create the stock search index for this backend if it is missing.
+
+    Idempotent, so it also runs after every migrate: rebuilding core_stock
+    on SQLite (as some schema changes do) drops the triggers that keep the
+    FTS table current. Without the index, searches fall back to a scan.
+    """
+    statements = INSTALL.get(connection.vendor)
+    if not statements:
+        return False
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                if connection.vendor == 'sqlite' and _sqlite_triggers_present(cursor):
+                    # Already installed and in sync; skip the rebuild
+                    return True
+                for statement in statements:
+                    cursor.execute(statement)
+    except Exception as e:
+        # e.g. no FTS5 trigram tokenizer (SQLite < 3.34) or no rights to
+        # create the pg_trgm extension
+        logger.warning(f'⚠️ Stock search index not installed, searches will scan: {e}')
+        return False
+    _sqlite_index_ready.pop(connection.alias, None)
+    return True
+
+
+def uninstall_search_index(connection):
+    with connection.cursor() as cursor:
+        for statement in UNINSTALL.get(connection.vendor, []):
+            cursor.execute(statement)
+    _sqlite_index_ready.pop(connection.alias, None)
+
+
+def _sqlite_triggers_present(cursor):
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+        [f'{SQLITE_SEARCH_TABLE}_a_'],
+    )
+    return cursor.fetchone()[0] == 3
+
+
+def _sqlite_has_index(connection):
+    if connection.alias not in _sqlite_index_ready:
+        _sqlite_index_ready[connection.alias] = (
+            SQLITE_SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _sqlite_index_ready[connection.alias]
+
+
+def _fts_phrase(query):
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _symbol_prefix(connection, term):
+    if connection.vendor == 'sqlite':
+        # A range the unique symbol index serves; SQLite's LIKE cannot use it
+        return Q(symbol__gte=term, symbol__lt=term + PREFIX_UPPER_BOUND)
+    # Served by the symbol trigram index on PostgreSQL
+    return Q(symbol__istartswith=term)
+
+
+def _substring_match(connection, query):
+    if connection.vendor == 'sqlite' and _sqlite_has_index(connection):
+        return Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_SEARCH_TABLE} WHERE {SQLITE_SEARCH_TABLE} MATCH %s',
+            [_fts_phrase(query)],
+        ))
+    # On PostgreSQL the trigram indexes serve these
+    return Q(symbol__icontains=query) | Q(name__icontains=query)
+
+
+def search_stocks(queryset, query):
+    """Stocks whose symbol or name contains ``query``, annotated with ``search_rank``.
+
+    Rank 0 is an exact symbol match, 1 a symbol prefix, 2 a name prefix and
+    3 any other match, so ordering by search_rank puts the likeliest hits
+    first. Matches are found through the backend's search index (FTS5
+    trigram on SQLite, pg_trgm on PostgreSQL) rather than by scanning.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    connection = connections[queryset.db]
+    term = query.upper()
+    symbol_prefix = _symbol_prefix(connection, term)
+
+    if len(query) < TRIGRAM_MIN_LENGTH:
+        # The name prefix scans, but only for one- and two-character queries
+        matches = symbol_prefix | Q(name__istartswith=query)
+    else:
+        matches = _substring_match(connection, query)
+
+    return queryset.filter(matches).annotate(search_rank=Case(
+        When(symbol=term, then=Value(0)),
+        When(symbol_prefix, then=Value(1)),
+        When(name__istartswith=query, then=Value(2)),
+        default=Value(3),
+        output_field=IntegerField(),
+    ))
@@ -0,0 +1,122 @@
+import bisect
+import threading
+import time
+from django.conf import settings
+from apps.core.models import Stock
+from .cache import price_epoch
+
+# Sorts after every character a key can contain
+PREFIX_UPPER_BOUND = '\U0010ffff'
+
+
+class StockIndex:
+    """Sorted arrays of active stock symbols and name words, searched by prefix.
+
+    Built from one query over the active stocks and then read without
+    touching the database; a lookup is two binary searches plus a slice.
+    """
+
+    def __init__(self, rows):
+        self.entries = {}
+        symbols = []
+        words = []
+        for stock_id, symbol, name, price in rows:
+            self.entries[stock_id] = {
+                'id': stock_id,
+                'symbol': symbol,
+                'name': name,
+                'price': float(price),
+            }
+            symbols.append((symbol.lower(), symbol, stock_id))
+            for word in set(name.lower().split()):
+                words.append((word, symbol, stock_id))
+        symbols.sort()
+        words.sort()
+        self.symbol_keys = [key for key, _, _ in symbols]
+        self.symbol_ids = [stock_id for _, _, stock_id in symbols]
+        self.word_keys = [key for key, _, _ in words]
+        self.word_ids = [stock_id for _, _, stock_id in words]
+
+    @staticmethod
+    def _prefixed(keys, ids, prefix):
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + PREFIX_UPPER_BOUND, start)
+        return ids[start:end]
+
+    def search(self, query, limit):
+        """Exact symbol first, then symbol prefixes, then name-word prefixes"""
+        words = query.lower().split()
+        if not words:
+            return []
+        found = []
+        seen = set()
+
+        def add(stock_ids):
+            for stock_id in stock_ids:
+                if stock_id not in seen:
+                    seen.add(stock_id)
+                    found.append(stock_id)
+                    if len(found) >= limit:
+                        return True
+            return False
+
+        prefix = query.strip().lower()
+        symbol_matches = self._prefixed(self.symbol_keys, self.symbol_ids, prefix)
+        exact = [i for i in symbol_matches[:1] if self.entries[i]['symbol'].lower() == prefix]
+        if not (add(exact) or add(symbol_matches)):
+            # Every word of the query must start one of the name's words
+            candidates = self._prefixed(self.word_keys, self.word_ids, words[0])
+            if len(words) > 1:
+                candidates = [i for i in candidates if self._name_matches(i, words[1:])]
+            add(candidates)
+        return [self.entries[stock_id] for stock_id in found]
+
+    def _name_matches(self, stock_id, words):
+        name_words = self.entries[stock_id]['name'].lower().split()
+        return all(any(w.startswith(word) for w in name_words) for word in words)
+
+
+class StockTypeahead:
+    """Process-wide StockIndex, rebuilt when the price epoch moves.
+
+    Stocks added without a price sync show up once the index is older than
+    TYPEAHEAD_MAX_AGE seconds. Only one thread rebuilds at a time; the
+    others keep answering from the previous index meanwhile.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._epoch = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def _stale(self, epoch):
+        return (
+            self._index is None
+            or epoch != self._epoch
+            or time.monotonic() - self._built_at > settings.TYPEAHEAD_MAX_AGE
+        )
+
+    def index(self):
+        epoch = price_epoch()
+        if self._stale(epoch):
+            blocking = self._index is None
+            if self._lock.acquire(blocking=blocking):
+                try:
+                    if self._stale(epoch):
+                        self._index = StockIndex(build_rows())
+                        self._epoch = epoch
+                        self._built_at = time.monotonic()
+                finally:
+                    self._lock.release()
+        return self._index
+
+    def search(self, query, limit=10):
+        return self.index().search(query, limit)
+
+
+def build_rows():
+    return Stock.objects.filter(is_active=True).values_list('id', 'symbol', 'name', 'current_price')
+
+
+typeahead = StockTypeahead()
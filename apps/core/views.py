@@ -1,36 +1,56 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.decorators import login_required
 from django.views.generic import TemplateView, ListView, DetailView, CreateView, View
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.urls import reverse_lazy
-from django.db.models import Sum, Count, Q
-from django.http import JsonResponse
+from django.urls import reverse, reverse_lazy
+from django.db.models import Sum, Count, F, Q
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.core.management import call_command
+from django.utils.decorators import method_decorator
 from django.conf import settings
-from .models import Stock, Profile
-from apps.portfolio.models import Portfolio, Holding, ChartView
+from .models import PriceAlert, Stock, Profile
+from apps.portfolio.models import Portfolio, Holding, ChartView, valuations_cache_key
 from apps.payments.models import Deposit
 from datetime import datetime, timedelta
+import asyncio
 import json
 from decimal import Decimal
-from .forms import CustomUserCreationForm 
-import io
-import sys
+from .forms import CustomUserCreationForm, PriceAlertForm
+from .utils.db import read_from_replica
+from .utils.cache import cached_compute, deferred, fragment_version
+from .utils import counters, health
+from .utils.async_views import async_login_required
+from .utils.pagination import KeysetPaginationMixin
+from .utils.stock_search import search_stocks
+from .utils.typeahead import typeahead
+from .utils.leaderboards import leaderboards
+from .utils.live_prices import broadcaster
+from apps.portfolio.tasks import run_sheets_sync_job
+from celery.result import AsyncResult
+from asgiref.sync import sync_to_async
 
+@method_decorator(read_from_replica, name='dispatch')
 class HomeView(TemplateView):
     template_name = 'core/home.html'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['total_users'] = User.objects.count()
-        context['total_stocks'] = Stock.objects.count()
-        context['total_deposits'] = Deposit.objects.filter(status='completed').count()
-        context['top_stocks'] = Stock.objects.filter(is_active=True).order_by('-current_price')[:5]
+        context.update(cached_compute('home:stats', settings.HOME_STATS_TTL, home_stats))
+        context['top_stocks'] = leaderboards()['highest_price'][:5]
         return context
 
+def home_stats():
+    """Site-wide counts shown on the home page"""
+    counts = counters.read()
+    return {
+        'total_users': counts['users'],
+        'total_stocks': counts['stocks'],
+        'total_deposits': counts['completed_deposits'],
+    }
+
 class DashboardView(LoginRequiredMixin, TemplateView):
     template_name = 'core/dashboard.html'
     
@@ -38,33 +58,61 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user = self.request.user
         
-        # Get user portfolios
-        portfolios = Portfolio.objects.filter(user=user)
-        context['portfolios'] = portfolios
-        
-        # Get recent deposits
-        context['recent_deposits'] = Deposit.objects.filter(user=user).order_by('-created_at')[:5]
-        
-        # Calculate total portfolio value
-        total_value = 0
-        for portfolio in portfolios:
-            portfolio.update_total_value()
-            total_value += portfolio.total_value
-        context['total_portfolio_value'] = total_value
-        
-        # Get recently viewed stocks
-        recent_views = ChartView.objects.filter(user=user).select_related('stock')[:5]
-        context['recent_stocks'] = [view.stock for view in recent_views]
+        # The data is only loaded if the page fragment is not already cached
+        context['fragment_version'] = fragment_version(user.id)
+        context.update(deferred(
+            lambda: dashboard_data(user),
+            'portfolios', 'total_portfolio_value', 'recent_deposits', 'recent_stocks', 'chart_data',
+        ))
         
         # Chart data for portfolio performance (mock data for demo)
         labels = [(datetime.now() - timedelta(days=x)).strftime('%Y-%m-%d') for x in range(30, 0, -1)]
-        data = [float(total_value) * (1 + (x/1000)) for x in range(30)]
-        
         context['chart_labels'] = json.dumps(labels)
-        context['chart_data'] = json.dumps(data)
         
         return context
 
+def dashboard_data(user):
+    """Portfolios, deposits and recently viewed stocks shown on a user's dashboard"""
+    portfolios, total_value = cached_compute(
+        valuations_cache_key(user.id),
+        settings.PORTFOLIO_VALUATION_TTL,
+        lambda: portfolio_valuations(user),
+    )
+    
+    # Get recently viewed stocks
+    recent_views = ChartView.objects.filter(user=user).select_related('stock')[:5]
+    
+    return {
+        'portfolios': portfolios,
+        'total_portfolio_value': total_value,
+        'recent_deposits': list(Deposit.objects.filter(user=user).order_by('-created_at')[:5]),
+        'recent_stocks': [view.stock for view in recent_views],
+        'chart_data': json.dumps([float(total_value) * (1 + (x/1000)) for x in range(30)]),
+    }
+
+def portfolio_valuations(user):
+    """A user's portfolios valued at current prices, and their total"""
+    # Get user portfolios with their current value in one query
+    portfolios = list(
+        Portfolio.objects.filter(user=user).annotate(
+            holdings_count=Count('holdings'),
+            current_value=Sum(F('holdings__quantity') * F('holdings__stock__current_price')),
+        )
+    )
+    
+    # Calculate total portfolio value, storing only values that moved
+    total_value = 0
+    changed = []
+    for portfolio in portfolios:
+        current_value = portfolio.current_value or 0
+        if portfolio.total_value != current_value:
+            portfolio.total_value = current_value
+            changed.append(portfolio)
+        total_value += current_value
+    if changed:
+        Portfolio.objects.bulk_update(changed, ['total_value'])
+    return portfolios, total_value
+
 class ProfileView(LoginRequiredMixin, View):
     template_name = 'core/profile.html'
     
@@ -105,33 +153,47 @@ class ProfileView(LoginRequiredMixin, View):
         messages.success(request, 'Profile updated successfully!')
         return redirect('core:profile')
 
-class StockListView(ListView):
+@method_decorator(read_from_replica, name='dispatch')
+class StockListView(KeysetPaginationMixin, ListView):
     model = Stock
     template_name = 'core/stock_list.html'
     context_object_name = 'stocks'
     paginate_by = 20
     
+    SORT_FIELDS = ['symbol', 'name', 'current_price', 'change_percent']
+    
+    def get_sort(self):
+        sort = self.request.GET.get('sort', 'symbol')
+        return sort if sort in self.SORT_FIELDS else 'symbol'
+    
+    def get_search(self):
+        return self.request.GET.get('search', '').strip()
+    
+    def get_keyset(self):
+        # Sorting; the id breaks ties so every row has a distinct position
+        keyset = [self.get_sort(), 'id']
+        if self.get_search():
+            # Best matches first, then the chosen sort within each rank
+            keyset.insert(0, 'search_rank')
+        return keyset
+    
     def get_queryset(self):
         queryset = Stock.objects.filter(is_active=True)
         
         # Search functionality
-        search = self.request.GET.get('search')
+        search = self.get_search()
         if search:
-            queryset = queryset.filter(
-                Q(symbol__icontains=search) | Q(name__icontains=search)
-            )
-        
-        # Sorting
-        sort = self.request.GET.get('sort', 'symbol')
-        if sort in ['symbol', 'name', 'current_price', 'change_percent']:
-            queryset = queryset.order_by(sort)
+            queryset = search_stocks(queryset, search)
         
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['search'] = self.request.GET.get('search', '')
-        context['sort'] = self.request.GET.get('sort', 'symbol')
+        context['search'] = self.get_search()
+        context['sort'] = self.get_sort()
+        boards = leaderboards()
+        context['top_gainers'] = boards['gainers'][:3]
+        context['top_losers'] = boards['losers'][:3]
         return context
 
 class StockDetailView(LoginRequiredMixin, DetailView):
@@ -144,7 +206,7 @@ class StockDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        stock = self.get_object()
+        stock = self.object
         
         # Track view
         ChartView.objects.create(user=self.request.user, stock=stock)
@@ -156,7 +218,12 @@ class StockDetailView(LoginRequiredMixin, DetailView):
         context['user_holdings'] = Holding.objects.filter(
             portfolio__user=self.request.user,
             stock=stock
+        ).select_related('portfolio', 'stock')
+        
+        context['price_alerts'] = PriceAlert.objects.filter(
+            user=self.request.user, stock=stock, is_active=True
         )
+        context['price_alert_form'] = PriceAlertForm()
         
         # Generate historical data for chart (mock data for demo)
         import random
@@ -170,6 +237,31 @@ class StockDetailView(LoginRequiredMixin, DetailView):
         
         return context
 
+class AddPriceAlertView(LoginRequiredMixin, View):
+    def post(self, request, symbol):
+        stock = get_object_or_404(Stock, symbol=symbol, is_active=True)
+        form = PriceAlertForm(request.POST)
+        
+        if PriceAlert.objects.filter(user=request.user, stock=stock, is_active=True).count() >= settings.PRICE_ALERTS_PER_STOCK:
+            messages.error(request, f'You already have {settings.PRICE_ALERTS_PER_STOCK} alerts on {stock.symbol}')
+        elif form.is_valid():
+            alert = form.save(commit=False)
+            alert.user = request.user
+            alert.stock = stock
+            alert.save()
+            messages.success(request, f'We will email you when {stock.symbol} crosses ${alert.threshold}')
+        else:
+            messages.error(request, ' '.join(form.errors.get('threshold', ['Invalid price'])))
+        
+        return redirect('core:stock_detail', symbol=stock.symbol)
+
+class DeletePriceAlertView(LoginRequiredMixin, View):
+    def post(self, request, pk):
+        alert = get_object_or_404(PriceAlert.objects.select_related('stock'), pk=pk, user=request.user)
+        alert.delete()
+        messages.success(request, f'Removed your {alert.stock.symbol} alert at ${alert.threshold}')
+        return redirect('core:stock_detail', symbol=alert.stock.symbol)
+
 class RegisterView(CreateView):
     form_class = CustomUserCreationForm  
     template_name = 'auth/register.html'
@@ -183,10 +275,8 @@ class RegisterView(CreateView):
         return response
 
 # ========== WEBHOOK FOR GOOGLE SHEETS SYNC (FOR RENDER FREE TIER) ==========
-@csrf_exempt
-def webhook_sync_stocks(request):
-    """Webhook endpoint to trigger Google Sheets sync without shell access"""
-    
+def _check_sync_token(request):
+    """Return an error response unless the request carries the sync token"""
     # Simple security check - use a secret token from settings
     auth_token = request.headers.get('X-Sync-Token')
     expected_token = getattr(settings, 'SYNC_SECRET_TOKEN', None)
@@ -200,42 +290,139 @@ def webhook_sync_stocks(request):
     if (not auth_token or auth_token != expected_token) and (not url_token or url_token != expected_token):
         return JsonResponse({'error': 'Unauthorized - Invalid token'}, status=403)
     
+    return None
+
+@csrf_exempt
+def webhook_sync_stocks(request):
+    """Webhook endpoint to trigger Google Sheets sync without shell access.
+    
+    The sync runs as a Celery job; the response carries the job id and the
+    URL to poll for its status.
+    """
+    error = _check_sync_token(request)
+    if error:
+        return error
+    
     if request.method not in ['POST', 'GET']:
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
     try:
-        # Capture command output
-        old_stdout = sys.stdout
-        sys.stdout = io.StringIO()
-        
-        # Run the sync command
-        call_command('sync_google_sheets', direction='from_sheets')
-        
-        output = sys.stdout.getvalue()
-        sys.stdout = old_stdout
-        
-        # Get stock count
-        stock_count = Stock.objects.count()
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Stocks synced successfully',
-            'stock_count': stock_count,
-            'output': output.split('\n')[:10]  # Return first 10 lines of output
-        })
+        job = run_sheets_sync_job.delay(direction='from_sheets')
     except Exception as e:
+        # Broker or result backend unreachable
         return JsonResponse({
             'success': False,
-            'error': str(e)
-        }, status=500)
+            'error': f'Could not enqueue sync job: {e}'
+        }, status=503)
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Sync job queued',
+        'job_id': job.id,
+        'status_url': reverse('api_sync_status', kwargs={'job_id': job.id}),
+    }, status=202)
+
+def _job_state(job_id):
+    result = AsyncResult(job_id)
+    return result.state, result.info
+
+async def webhook_sync_status(request, job_id):
+    """Report state, progress, counts and captured output of a sync job"""
+    error = _check_sync_token(request)
+    if error:
+        return error
+    
+    # The result backend client is blocking; keep it off the event loop
+    state, raw_info = await sync_to_async(_job_state, thread_sensitive=False)(job_id)
+    info = raw_info if isinstance(raw_info, dict) else {}
+    
+    response = {
+        'job_id': job_id,
+        'state': state,
+        'progress': info.get('progress'),
+        'counts': info.get('counts'),
+        'output': info.get('output', []),
+    }
+    if state == 'SUCCESS':
+        response['success'] = info.get('success', True)
+        response['error'] = info.get('error')
+        response['stock_count'] = await Stock.objects.acount()
+    elif state == 'FAILURE':
+        response['success'] = False
+        response['error'] = str(raw_info)
+    
+    return JsonResponse(response)
 
 # ========== HEALTH CHECK ENDPOINT ==========
-def health_check(request):
+@read_from_replica
+async def health_check(request):
     """Health check endpoint for monitoring"""
+    counts = await sync_to_async(counters.read)()
     return JsonResponse({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'stock_count': Stock.objects.count(),
-        'user_count': User.objects.count(),
-        'deposit_count': Deposit.objects.count()
-    })
\ No newline at end of file
+        'stock_count': counts['stocks'],
+        'user_count': counts['users'],
+        'deposit_count': counts['deposits'],
+    })
+
+def liveness(request):
+    """Liveness probe: the process is up and serving requests. Does no I/O."""
+    return JsonResponse({'status': 'alive'})
+
+async def readiness(request):
+    """Readiness probe with per-dependency status and latency.
+
+    Answers 503 only when a READINESS_REQUIRED dependency is down; results
+    are reused for READINESS_CACHE_SECONDS so probe bursts stay cheap.
+    """
+    report = await health.readiness()
+    return JsonResponse(
+        {**report, 'timestamp': datetime.now().isoformat()},
+        status=503 if report['status'] == 'unavailable' else 200,
+    )
+
+# ========== STOCK TYPEAHEAD ==========
+@login_required
+def stock_typeahead(request):
+    """Active stocks matching ?q= by symbol or name prefix, for autocomplete widgets"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), settings.TYPEAHEAD_MAX_RESULTS))
+    except ValueError:
+        limit = 10
+    results = typeahead.search(query, limit) if query else []
+    response = JsonResponse({'query': query, 'results': results})
+    response['Cache-Control'] = 'private, max-age=30'
+    return response
+
+# ========== LIVE PRICES ==========
+@async_login_required
+async def price_stream(request):
+    """Server-sent events stream of quote updates, optionally filtered by ?symbols="""
+    if not hasattr(request, 'scope'):
+        # A WSGI worker would be held for the whole connection
+        return JsonResponse({'error': 'Live prices are only served by the ASGI server'}, status=501)
+    
+    symbols = {s.strip().upper() for s in request.GET.get('symbols', '').split(',') if s.strip()}
+    
+    async def events():
+        subscription = broadcaster.subscribe(symbols)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    quotes = await asyncio.wait_for(
+                        subscription.queue.get(), settings.PRICE_STREAM_HEARTBEAT
+                    )
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: quotes\ndata: {json.dumps(quotes)}\n\n'
+        finally:
+            broadcaster.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
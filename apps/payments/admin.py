@@ -21,7 +21,7 @@ class DepositAdmin(admin.ModelAdmin):
     list_filter = ('status', 'payment_method', 'synced_to_sheets', 'created_at')
     search_fields = ('transaction_id', 'invoice_number', 'user__email', 'user__username')
     readonly_fields = ('transaction_id', 'invoice_number', 'created_at', 'updated_at', 
-                      'completed_at', 'invoice_link')
+                      'completed_at', 'invoice_link', 'allocated_at', 'allocated_quantity', 'allocation_price')
     raw_id_fields = ('user', 'portfolio', 'stock')
     inlines = [InvoiceInline]
     actions = ['mark_as_completed', 'generate_invoice', 'sync_to_sheets']
@@ -35,6 +35,10 @@ class DepositAdmin(admin.ModelAdmin):
             'fields': ('status', 'synced_to_sheets', 'completed_at', 'invoice_link'),
             'classes': ('wide',)
         }),
+        ('Allocation', {
+            'fields': ('allocated_at', 'allocated_quantity', 'allocation_price'),
+            'classes': ('collapse',)
+        }),
         ('Identifiers', {
             'fields': ('transaction_id', 'invoice_number'),
             'classes': ('collapse',)
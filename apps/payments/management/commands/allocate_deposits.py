@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.payments.models import Deposit
+from apps.core.utils.ledger import allocate_deposits
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Buy shares for completed stock deposits that were not allocated when they completed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.DEPOSIT_ALLOCATION_BATCH_SIZE,
+                            help='Deposits allocated per transaction')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            batch = list(
+                Deposit.unallocated().order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            allocated = allocate_deposits(Deposit.objects.filter(pk__in=batch))
+            # Everything left is locked by a concurrent allocation; it will finish them
+            if not allocated:
+                break
+            total += allocated
+            self.stdout.write(f'  Allocated {allocated} deposits')
+
+        logger.info(f'Allocated {total} deposits to holdings')
+        self.stdout.write(self.style.SUCCESS(f'Allocated {total} deposits to holdings'))
@@ -1,7 +1,9 @@
 from django.core.management.base import BaseCommand
 from django.core.files.base import ContentFile
-from apps.payments.models import Deposit
+from apps.payments.models import NEEDS_INVOICE, Deposit
 from apps.core.utils.pdf_generator import generate_invoice_pdf
+from apps.core.utils.instrumentation import SyncRunRecorder
+from apps.core.utils.locks import JobLock
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,37 +14,77 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--deposit-id', type=int, help='Generate for specific deposit')
         parser.add_argument('--all', action='store_true', help='Generate for all pending deposits')
+        parser.add_argument('--trigger', type=str, choices=['manual', 'cron', 'celery', 'webhook'], default='manual',
+                            help='What started this run (recorded on the SyncRun)')
     
     def handle(self, *args, **options):
+        lock = JobLock('invoice_batch')
+        if options['deposit_id']:
+            with lock:
+                if not lock.acquired:
+                    self.stdout.write(self.style.WARNING('Another invoice batch is running; try again shortly'))
+                    return
+                with SyncRunRecorder('invoice_batch', trigger=options['trigger']) as run:
+                    self.generate(run, options)
+            return
+        
+        runs = 0
+        
+        def batch(requests):
+            nonlocal runs
+            if runs:
+                # Batches requested while we were running share one follow-up run
+                self.stdout.write('Running queued follow-up batch...')
+            runs += 1
+            with SyncRunRecorder('invoice_batch', trigger=options['trigger']) as run:
+                self.generate(run, options)
+        
+        outcome = lock.run_coalesced(batch, max_runs=2)
+        if outcome == 'queued':
+            self.stdout.write(self.style.WARNING('Another invoice batch is running; queued a follow-up run'))
+        elif outcome == 'skipped':
+            self.stdout.write(self.style.WARNING(
+                'Another invoice batch is running and a follow-up run could not be queued; nothing was generated'
+            ))
+    
+    def generate(self, run, options):
         if options['deposit_id']:
             deposits = Deposit.objects.filter(id=options['deposit_id'])
         elif options['all']:
             deposits = Deposit.objects.filter(
+                NEEDS_INVOICE,
                 status='completed',
-                invoice_pdf__isnull=True
             )
         else:
             deposits = Deposit.objects.filter(
+                NEEDS_INVOICE,
                 status='completed',
-                invoice_pdf__isnull=True
             )[:10]  # Limit to 10 by default
         
-        if not deposits.exists():
+        with run.phase('select'):
+            deposits = list(deposits)
+        run.rows_read = len(deposits)
+        
+        if not deposits:
             self.stdout.write('No deposits needing invoices')
             return
         
-        self.stdout.write(f'Generating invoices for {deposits.count()} deposits...')
+        self.stdout.write(f'Generating invoices for {len(deposits)} deposits...')
         
         for deposit in deposits:
             try:
-                pdf_content = generate_invoice_pdf(deposit)
+                with run.phase('render'):
+                    pdf_content = generate_invoice_pdf(deposit)
                 
                 # Save PDF to deposit
                 filename = f"invoice_{deposit.invoice_number}.pdf"
-                deposit.invoice_pdf.save(filename, ContentFile(pdf_content), save=True)
+                with run.phase('store'):
+                    deposit.invoice_pdf.save(filename, ContentFile(pdf_content), save=True)
+                run.rows_written += 1
                 
                 self.stdout.write(f'  Generated: {filename}')
                 
             except Exception as e:
                 logger.error(f'Failed to generate invoice for deposit {deposit.id}: {str(e)}')
+                run.error(f'Deposit {deposit.transaction_id}: {e}')
                 self.stdout.write(self.style.ERROR(f'  Failed: {deposit.transaction_id}'))
\ No newline at end of file
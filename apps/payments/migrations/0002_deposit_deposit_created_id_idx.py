@@ -0,0 +1,17 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['created_at', 'id'], name='deposit_created_id_idx'),
+        ),
+    ]
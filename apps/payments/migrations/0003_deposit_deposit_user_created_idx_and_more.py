@@ -0,0 +1,29 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_stock_stock_active_symbol_idx'),
+        ('payments', '0002_deposit_deposit_created_id_idx'),
+        ('portfolio', '0002_chartview_chartview_user_viewed_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', '-created_at'], name='deposit_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(condition=models.Q(('invoice_pdf__isnull', True)), fields=['status'], name='deposit_needs_invoice_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(condition=models.Q(('synced_to_sheets', False)), fields=['created_at', 'id'], name='deposit_unsynced_idx'),
+        ),
+    ]
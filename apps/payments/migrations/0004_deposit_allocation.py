@@ -0,0 +1,46 @@
+# Generated by Django 5.2.11 on 2026-10-19 15:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def mark_existing_deposits(apps, schema_editor):
+    """Deposits completed before allocation existed are not bought retroactively"""
+    Deposit = apps.get_model('payments', 'Deposit')
+    Deposit.objects.filter(status='completed', stock__isnull=False).update(
+        allocated_at=Coalesce('completed_at', 'updated_at'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_pricealert'),
+        ('payments', '0003_deposit_deposit_user_created_idx_and_more'),
+        ('portfolio', '0003_trade_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deposit',
+            name='allocated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='allocated_quantity',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='deposit',
+            name='allocation_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(condition=models.Q(('allocated_at__isnull', True), ('status', 'completed'), ('stock__isnull', False)), fields=['id'], name='deposit_unallocated_idx'),
+        ),
+        migrations.RunPython(mark_existing_deposits, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.11 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_deposit_allocation'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='deposit',
+            name='deposit_needs_invoice_idx',
+        ),
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(condition=models.Q(('invoice_pdf__isnull', True), ('invoice_pdf', ''), _connector='OR'), fields=['status'], name='deposit_needs_invoice_idx'),
+        ),
+    ]
@@ -1,10 +1,21 @@
-from django.db import models
+from django.db import models, router
 from django.contrib.auth.models import User
 from apps.core.models import TimeStampedModel, Stock
+from apps.core.utils.cache import bump_data_version
 from apps.portfolio.models import Portfolio
 import uuid
+import logging
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+
+# Deposits without an invoice PDF; FileField stores a missing file as '' and
+# only rows that predate the field hold NULL
+NEEDS_INVOICE = models.Q(invoice_pdf__isnull=True) | models.Q(invoice_pdf='')
+
+# Written by apps.core.utils.ledger.allocate_deposits() alone
+ALLOCATION_FIELDS = {'allocated_at', 'allocated_quantity', 'allocation_price'}
+
 class Deposit(TimeStampedModel):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -35,6 +46,35 @@ class Deposit(TimeStampedModel):
     notes = models.TextField(blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    # Shares of ``stock`` bought into the portfolio when the deposit completed
+    allocated_at = models.DateTimeField(null=True, blank=True)
+    allocated_quantity = models.DecimalField(max_digits=15, decimal_places=4, null=True, blank=True)
+    allocation_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # Keyset order of the incremental export to Google Sheets
+            models.Index(fields=['created_at', 'id'], name='deposit_created_id_idx'),
+            # Recent deposits on the dashboard and profile
+            models.Index(fields=['user', '-created_at'], name='deposit_user_created_idx'),
+            # Partial indexes (skipped on backends without partial index support)
+            models.Index(
+                fields=['status'],
+                condition=NEEDS_INVOICE,
+                name='deposit_needs_invoice_idx',
+            ),
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(synced_to_sheets=False),
+                name='deposit_unsynced_idx',
+            ),
+            models.Index(
+                fields=['id'],
+                condition=models.Q(status='completed', stock__isnull=False, allocated_at__isnull=True),
+                name='deposit_unallocated_idx',
+            ),
+        ]
+    
     def __str__(self):
         return f"Deposit {self.transaction_id} - {self.amount}"
     
@@ -45,14 +85,14 @@ class Deposit(TimeStampedModel):
         
         if not is_new:
             try:
-                old_obj = Deposit.objects.get(pk=self.pk)
+                # Read the stored status from the primary, never a lagging replica
+                old_obj = Deposit.objects.using(router.db_for_write(Deposit, instance=self)).get(pk=self.pk)
                 old_status = old_obj.status
             except Deposit.DoesNotExist:
                 pass
         
         # Generate invoice number if it doesn't exist
         if not self.invoice_number:
-            from django.utils import timezone
             now = timezone.now()
             self.invoice_number = f"INV-{now.strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
         
@@ -60,8 +100,28 @@ class Deposit(TimeStampedModel):
         if self.status == 'completed' and not self.completed_at:
             self.completed_at = timezone.now()
         
-        # Save first
+        # A stale instance must not clear an allocation made since it was loaded
+        if old_status is not None and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ALLOCATION_FIELDS
+            ]
+        
+        # Save first; the counter signals compare against the stored status
+        self._previous_status = old_status
         super().save(*args, **kwargs)
+        bump_data_version(self.user_id)
+        
+        # Buy the deposit's shares when it completes; a no-op if already allocated
+        if self.status == 'completed' and (is_new or old_status != 'completed') and self.stock_id:
+            from apps.core.utils.ledger import allocate_deposits
+            
+            try:
+                allocate_deposits(Deposit.objects.filter(pk=self.pk))
+                self.refresh_from_db(fields=ALLOCATION_FIELDS)
+            except Exception as e:
+                # Left unallocated; the allocate_deposits sweep picks it up
+                logger.error(f"Failed to allocate shares for deposit {self.id}: {e}")
         
         # If status changed to completed, generate invoice
         if self.status == 'completed' and (is_new or old_status != 'completed'):
@@ -76,6 +136,17 @@ class Deposit(TimeStampedModel):
                     logger.info(f"Invoice generated for deposit {self.id}")
                 except Exception as e:
                     logger.error(f"Failed to generate invoice for deposit {self.id}: {e}")
+    
+    def delete(self, *args, **kwargs):
+        bump_data_version(self.user_id)
+        return super().delete(*args, **kwargs)
+    
+    @classmethod
+    def unallocated(cls):
+        """Completed stock deposits whose shares have not been bought yet"""
+        return cls.objects.filter(
+            status='completed', stock__isnull=False, allocated_at__isnull=True, stock__current_price__gt=0
+        )
 
 class Invoice(TimeStampedModel):
     deposit = models.OneToOneField(Deposit, on_delete=models.CASCADE, related_name='invoice')
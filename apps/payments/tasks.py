@@ -9,9 +9,18 @@ def generate_pending_invoices():
     """Generate invoices for pending deposits"""
     logger.info("Generating pending invoices...")
     try:
-        call_command('generate_invoices')
+        call_command('generate_invoices', trigger='celery')
         logger.info("Invoice generation completed")
         return "Invoices generated successfully"
     except Exception as e:
         logger.error(f"Invoice generation failed: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+@shared_task
+def allocate_pending_deposits():
+    """Buy shares for completed deposits whose allocation failed or was skipped"""
+    try:
+        call_command('allocate_deposits')
+    except Exception as e:
+        logger.error(f"Deposit allocation failed: {str(e)}")
+        raise e
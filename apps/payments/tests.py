@@ -0,0 +1,82 @@
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from apps.core.models import Stock
+from apps.core.utils.ledger import allocate_deposits
+from apps.payments.models import Deposit
+from apps.portfolio.models import Holding, Lot, Portfolio, Trade
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DepositAllocationTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user('investor', 'investor@example.com', 'secret')
+        self.portfolio = Portfolio.objects.create(user=self.user, name='Main')
+        self.stock = Stock.objects.create(symbol='ACME', name='Acme Corp', current_price=Decimal('25.00'))
+
+    def deposit(self, **kwargs):
+        return Deposit.objects.create(
+            user=self.user, portfolio=self.portfolio, stock=self.stock,
+            amount=Decimal('100.00'), payment_method='bank_transfer', **kwargs,
+        )
+
+    def assertAllocatedOnce(self, deposit, quantity):
+        deposit.refresh_from_db()
+        self.assertEqual(deposit.allocated_quantity, quantity)
+        holding = Holding.objects.get(portfolio=self.portfolio, stock=self.stock)
+        self.assertEqual(holding.quantity, quantity)
+        self.assertEqual(Trade.objects.filter(holding=holding).count(), 1)
+        self.assertEqual(Lot.objects.filter(holding=holding).count(), 1)
+
+    def test_completion_then_bulk_pass_allocates_once(self):
+        deposit = self.deposit(status='pending')
+        deposit.status = 'completed'
+        deposit.save()
+
+        # The sheets import and the sweep both reach the same deposit afterwards
+        self.assertEqual(allocate_deposits(Deposit.objects.filter(pk=deposit.pk)), 0)
+        call_command('allocate_deposits', stdout=StringIO())
+        self.assertAllocatedOnce(deposit, Decimal('4.0000'))
+
+    def test_stale_instances_completing_together_allocate_once(self):
+        deposit = self.deposit(status='pending')
+        first = Deposit.objects.get(pk=deposit.pk)
+        second = Deposit.objects.get(pk=deposit.pk)
+
+        first.status = 'completed'
+        first.save()
+        second.status = 'completed'
+        second.notes = 'confirmed by bank'
+        second.save()
+
+        self.assertAllocatedOnce(deposit, Decimal('4.0000'))
+
+    def test_bulk_pass_adds_to_existing_holding(self):
+        Holding.objects.create(
+            portfolio=self.portfolio, stock=self.stock, quantity=Decimal('2'),
+            average_buy_price=Decimal('20.00'), cost_basis=Decimal('40'),
+        )
+        deposits = Deposit.objects.bulk_create([
+            Deposit(
+                transaction_id=f'TX-{i}', invoice_number=f'INV-{i}', user=self.user, portfolio=self.portfolio,
+                stock=self.stock, amount=Decimal('50.00'), payment_method='bank_transfer', status='completed',
+            )
+            for i in range(3)
+        ])
+
+        self.assertEqual(allocate_deposits(Deposit.objects.filter(pk__in=[d.pk for d in deposits])), 3)
+        holding = Holding.objects.get(portfolio=self.portfolio, stock=self.stock)
+        self.assertEqual(holding.quantity, Decimal('8.0000'))
+        self.assertEqual(holding.cost_basis, Decimal('190'))
+        self.assertEqual(Lot.objects.filter(holding=holding).count(), 3)
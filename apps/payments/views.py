@@ -10,18 +10,24 @@ from apps.portfolio.models import Portfolio
 from apps.core.models import Stock
 from apps.core.utils.pdf_generator import generate_invoice_pdf
 from apps.core.utils.google_sheets import GoogleSheetsClient
+from apps.core.utils.pagination import KeysetPaginationMixin
 import io
+import logging
 
-class DepositListView(LoginRequiredMixin, ListView):
+logger = logging.getLogger(__name__)
+
+class DepositListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Deposit
     template_name = 'payments/deposit_list.html'
     context_object_name = 'deposits'
     paginate_by = 20
+    keyset = ['-created_at', '-id']
+    count_rows = True
     
     def get_queryset(self):
         if self.request.user.is_superuser:
             return Deposit.objects.all().select_related('user', 'portfolio', 'stock')
-        return Deposit.objects.filter(user=self.request.user).select_related('portfolio', 'stock')
+        return Deposit.objects.filter(user=self.request.user).select_related('user', 'portfolio', 'stock')
 
 class DepositDetailView(LoginRequiredMixin, DetailView):
     model = Deposit
@@ -29,9 +35,10 @@ class DepositDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'deposit'
     
     def get_queryset(self):
+        queryset = Deposit.objects.select_related('user', 'portfolio', 'stock')
         if self.request.user.is_superuser:
-            return Deposit.objects.all()
-        return Deposit.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
 
 class DepositCreateView(LoginRequiredMixin, CreateView):
     model = Deposit
@@ -119,5 +126,5 @@ class InvoiceListView(LoginRequiredMixin, ListView):
     
     def get_queryset(self):
         if self.request.user.is_superuser:
-            return Invoice.objects.all().select_related('deposit')
-        return Invoice.objects.filter(deposit__user=self.request.user).select_related('deposit')
\ No newline at end of file
+            return Invoice.objects.all().select_related('deposit__user')
+        return Invoice.objects.filter(deposit__user=self.request.user).select_related('deposit__user')
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Portfolio, Holding, ChartView
+from .models import Portfolio, Holding, Trade, Lot, ChartView
 
 class HoldingInline(admin.TabularInline):
     model = Holding
@@ -14,12 +14,31 @@ class PortfolioAdmin(admin.ModelAdmin):
     inlines = [HoldingInline]
     readonly_fields = ('total_value',)
 
+class TradeInline(admin.TabularInline):
+    model = Trade
+    extra = 0
+    fields = ('executed_at', 'side', 'quantity', 'price')
+    readonly_fields = fields
+    can_delete = False
+    
+    # The ledger is written through apps.core.utils.ledger only
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Holding)
 class HoldingAdmin(admin.ModelAdmin):
-    list_display = ('portfolio', 'stock', 'quantity', 'average_buy_price', 'created_at')
+    list_display = ('portfolio', 'stock', 'quantity', 'average_buy_price', 'cost_basis', 'created_at')
     list_filter = ('portfolio__user', 'stock')
     search_fields = ('portfolio__name', 'stock__symbol')
     raw_id_fields = ('stock',)
+    readonly_fields = ('cost_basis',)
+    inlines = [TradeInline]
+
+@admin.register(Lot)
+class LotAdmin(admin.ModelAdmin):
+    list_display = ('holding', 'acquired_at', 'quantity', 'remaining', 'price')
+    search_fields = ('holding__stock__symbol', 'holding__portfolio__name')
+    raw_id_fields = ('holding', 'trade')
 
 @admin.register(ChartView)
 class ChartViewAdmin(admin.ModelAdmin):
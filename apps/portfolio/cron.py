@@ -14,7 +14,7 @@ class GoogleSheetsSyncCronJob(CronJobBase):
     
     def do(self):
         try:
-            call_command('sync_google_sheets', direction='both')
+            call_command('sync_google_sheets', direction='both', trigger='cron')
             logger.info("Google Sheets sync completed successfully")
         except Exception as e:
             logger.error(f"Google Sheets sync failed: {str(e)}")
\ No newline at end of file
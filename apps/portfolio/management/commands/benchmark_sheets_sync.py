@@ -0,0 +1,115 @@
+import csv
+import io
+import random
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from apps.core.utils.google_sheets import DEPOSIT_HEADER
+from apps.core.utils.sheet_backends import LocalFileBackend
+from apps.payments.models import Deposit
+from apps.portfolio.models import Portfolio
+from apps.portfolio.management.commands.sync_google_sheets import Command as SyncCommand
+
+STOCK_HEADER = ['Symbol', 'Name', 'Price', 'Previous Close', 'Volume', 'Last Updated']
+
+class Command(BaseCommand):
+    help = 'Benchmark sync_google_sheets against local sheets of increasing size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Sheet sizes to benchmark')
+        parser.add_argument('--direction', type=str, choices=['to_sheets', 'from_sheets', 'both'],
+                            default='from_sheets')
+        parser.add_argument('--fixture', type=str,
+                            help='Replay a recorded JSON fixture instead of synthetic sheets')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        results = []
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            if options['fixture']:
+                fixture = Path(options['fixture'])
+                (root / 'fixture.json').write_bytes(fixture.read_bytes())
+                sheet = LocalFileBackend(root).open('fixture')
+                runs = [('fixture', len(sheet.get_worksheet(0).get_all_values()) - 1)]
+            else:
+                runs = [(f'bench_{rows}', rows) for rows in options['rows']]
+
+            for sheet_id, rows in runs:
+                if sheet_id != 'fixture':
+                    self._write_synthetic_sheet(root / sheet_id, rows)
+                results.append(self._run(sheet_id, rows, options['direction'], root))
+
+        self.stdout.write('')
+        self.stdout.write(f'{"rows":>10} {"direction":>12} {"latency (s)":>12} {"rows/sec":>12} {"API calls":>10}')
+        for result in results:
+            self.stdout.write(
+                f'{result["rows"]:>10} {result["direction"]:>12} {result["latency"]:>12.3f} '
+                f'{result["rows_per_sec"]:>12.1f} {result["api_calls"]:>10}'
+                + ('' if result['ok'] else '  FAILED')
+            )
+
+    def _write_synthetic_sheet(self, directory, rows):
+        """Write Sheet1 (stocks) and an empty Sheet2 (deposits) as CSV"""
+        directory.mkdir()
+        with open(directory / 'Sheet1.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(STOCK_HEADER)
+            for i in range(rows):
+                price = round(random.uniform(1, 1000), 2)
+                writer.writerow([
+                    f'S{i:06d}', f'Synthetic {i}', f'${price:,.2f}',
+                    round(price * random.uniform(0.95, 1.05), 2),
+                    f'{random.randint(1000, 10_000_000):,}', '2026-01-01 09:00:00',
+                ])
+        with open(directory / 'Sheet2.csv', 'w', newline='') as f:
+            csv.writer(f).writerow(DEPOSIT_HEADER)
+
+    def _seed_deposits(self, rows):
+        """Create unsynced deposits for the to_sheets direction"""
+        user = User.objects.create(username='sheets-benchmark', email='bench@example.com')
+        portfolio = Portfolio.objects.create(user=user, name='Benchmark')
+        Deposit.objects.bulk_create(
+            [
+                Deposit(user=user, portfolio=portfolio, amount=Decimal('100.00'),
+                        payment_method='bank_transfer', transaction_id=f'bench-{i}')
+                for i in range(rows)
+            ],
+            batch_size=1000,
+        )
+
+    def _run(self, sheet_id, rows, direction, root):
+        """Run one sync inside a rolled-back transaction and measure it"""
+        out = io.StringIO()
+        command = SyncCommand(stdout=out, stderr=io.StringIO())
+
+        with override_settings(GOOGLE_SHEETS_BACKEND='local', GOOGLE_SHEETS_LOCAL_DIR=str(root),
+                               SHEETS_SYNC_SETTLE_SECONDS=0):
+            with transaction.atomic():
+                if direction in ['to_sheets', 'both']:
+                    self._seed_deposits(rows)
+
+                self.stdout.write(f'Benchmarking {sheet_id} ({direction})...')
+                start = time.perf_counter()
+                call_command(command, direction=direction, sheet_id=sheet_id)
+                latency = time.perf_counter() - start
+
+                transaction.set_rollback(True)
+
+        return {
+            'rows': rows,
+            'direction': direction,
+            'latency': latency,
+            'rows_per_sec': rows / latency if latency else 0,
+            'api_calls': command.client.api_calls if command.client else 0,
+            'ok': 'Sync failed' not in out.getvalue(),
+        }
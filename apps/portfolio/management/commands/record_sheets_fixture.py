@@ -0,0 +1,30 @@
+import json
+import logging
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from apps.core.utils.google_sheets import GoogleSheetsClient
+from apps.core.utils.sheet_backends import GspreadBackend
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Record every worksheet of a live Google Sheet into a JSON fixture for the local backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', type=str, help='Path of the JSON fixture to write')
+        parser.add_argument('--sheet-id', type=str, help='Google Sheet ID (optional)')
+
+    def handle(self, *args, **options):
+        sheet_id = options['sheet_id'] or settings.GOOGLE_SHEETS_ID
+        client = GoogleSheetsClient(sheet_id, backend=GspreadBackend())
+
+        worksheets = client.get_all_worksheet_values()
+        for worksheet in worksheets:
+            self.stdout.write(f'  Recorded {worksheet["title"]}: {len(worksheet["values"])} rows')
+
+        with open(options['output'], 'w') as f:
+            json.dump({'title': client.sheet.title, 'worksheets': worksheets}, f)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recorded {len(worksheets)} worksheets to {options["output"]} ({client.api_calls} API calls)'
+        ))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_stock_stock_active_symbol_idx'),
+        ('portfolio', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chartview',
+            index=models.Index(fields=['user', '-viewed_at'], name='chartview_user_viewed_idx'),
+        ),
+    ]
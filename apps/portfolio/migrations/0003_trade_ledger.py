@@ -0,0 +1,79 @@
+# Generated by Django 5.2.11 on 2026-10-19 15:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledgers(apps, schema_editor):
+    """Record every existing holding as one opening buy at its average price"""
+    Holding = apps.get_model('portfolio', 'Holding')
+    Trade = apps.get_model('portfolio', 'Trade')
+    Lot = apps.get_model('portfolio', 'Lot')
+    for holding in Holding.objects.filter(quantity__gt=0).iterator():
+        trade = Trade.objects.create(
+            holding=holding, side='buy', quantity=holding.quantity,
+            price=holding.average_buy_price, executed_at=holding.created_at,
+        )
+        Lot.objects.create(
+            holding=holding, trade=trade, quantity=holding.quantity, remaining=holding.quantity,
+            price=holding.average_buy_price, acquired_at=holding.created_at,
+        )
+        Holding.objects.filter(pk=holding.pk).update(cost_basis=holding.quantity * holding.average_buy_price)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0002_chartview_chartview_user_viewed_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='holding',
+            name='cost_basis',
+            field=models.DecimalField(decimal_places=6, default=0, max_digits=20),
+        ),
+        migrations.CreateModel(
+            name='Trade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('side', models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell')], max_length=4)),
+                ('quantity', models.DecimalField(decimal_places=4, max_digits=15)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('executed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('holding', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trades', to='portfolio.holding')),
+            ],
+            options={
+                'ordering': ['executed_at', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Lot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quantity', models.DecimalField(decimal_places=4, max_digits=15)),
+                ('remaining', models.DecimalField(decimal_places=4, max_digits=15)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('acquired_at', models.DateTimeField()),
+                ('holding', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='portfolio.holding')),
+                ('trade', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lot', to='portfolio.trade')),
+            ],
+            options={
+                'ordering': ['acquired_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trade',
+            index=models.Index(fields=['holding', 'executed_at', 'id'], name='trade_holding_executed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(condition=models.Q(('remaining__gt', 0)), fields=['holding', 'acquired_at', 'id'], name='lot_open_idx'),
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
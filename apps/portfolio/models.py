@@ -1,6 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from apps.core.models import TimeStampedModel, Stock
+from apps.core.utils.cache import invalidate, bump_data_version
+
+def valuations_cache_key(user_id):
+    """cached_compute key of a user's dashboard portfolio valuations"""
+    return f'portfolio:valuations:{user_id}'
 
 class Portfolio(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolios')
@@ -14,6 +20,16 @@ class Portfolio(TimeStampedModel):
     def __str__(self):
         return f"{self.user.email}'s {self.name}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate(valuations_cache_key(self.user_id))
+        bump_data_version(self.user_id)
+    
+    def delete(self, *args, **kwargs):
+        invalidate(valuations_cache_key(self.user_id))
+        bump_data_version(self.user_id)
+        return super().delete(*args, **kwargs)
+    
     def update_total_value(self):
         total = self.holdings.aggregate(
             total=models.Sum(models.F('quantity') * models.F('stock__current_price'))
@@ -22,10 +38,13 @@ class Portfolio(TimeStampedModel):
         self.save()
 
 class Holding(TimeStampedModel):
+    """Current position in one stock; quantity and cost basis are kept by the trade ledger (see apps.core.utils.ledger)"""
     portfolio = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name='holdings')
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='holdings')
     quantity = models.DecimalField(max_digits=15, decimal_places=4)
     average_buy_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Total cost of the shares still held, valued first in, first out
+    cost_basis = models.DecimalField(max_digits=20, decimal_places=6, default=0)
     
     class Meta:
         unique_together = ['portfolio', 'stock']
@@ -33,24 +52,92 @@ class Holding(TimeStampedModel):
     def __str__(self):
         return f"{self.portfolio} - {self.stock.symbol}: {self.quantity}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_data_version(self.portfolio.user_id)
+    
+    def delete(self, *args, **kwargs):
+        bump_data_version(self.portfolio.user_id)
+        return super().delete(*args, **kwargs)
+    
     @property
     def current_value(self):
         return self.quantity * self.stock.current_price
     
     @property
     def profit_loss(self):
-        return (self.stock.current_price - self.average_buy_price) * self.quantity
+        return self.current_value - self.cost_basis
     
     @property
     def profit_loss_percent(self):
-        if self.average_buy_price:
-            return ((self.stock.current_price - self.average_buy_price) / self.average_buy_price) * 100
+        if self.cost_basis:
+            return (self.profit_loss / self.cost_basis) * 100
         return 0
 
+class Trade(TimeStampedModel):
+    """One buy or sell of a holding, kept as history"""
+    SIDE_CHOICES = [
+        ('buy', 'Buy'),
+        ('sell', 'Sell'),
+    ]
+    
+    holding = models.ForeignKey(Holding, on_delete=models.CASCADE, related_name='trades')
+    side = models.CharField(max_length=4, choices=SIDE_CHOICES)
+    quantity = models.DecimalField(max_digits=15, decimal_places=4)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    executed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['executed_at', 'id']
+        indexes = [
+            models.Index(fields=['holding', 'executed_at', 'id'], name='trade_holding_executed_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_side_display()} {self.quantity} {self.holding.stock.symbol} @ {self.price}"
+    
+    @property
+    def value(self):
+        return self.quantity * self.price
+
+class Lot(TimeStampedModel):
+    """Shares bought by one buy trade; sells use up the oldest open lots first"""
+    holding = models.ForeignKey(Holding, on_delete=models.CASCADE, related_name='lots')
+    trade = models.OneToOneField(Trade, on_delete=models.CASCADE, related_name='lot')
+    quantity = models.DecimalField(max_digits=15, decimal_places=4)
+    remaining = models.DecimalField(max_digits=15, decimal_places=4)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    acquired_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['acquired_at', 'id']
+        indexes = [
+            # The open lots of a holding, oldest first, as a sell consumes them
+            models.Index(
+                fields=['holding', 'acquired_at', 'id'], name='lot_open_idx',
+                condition=models.Q(remaining__gt=0),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.remaining}/{self.quantity} {self.holding.stock.symbol} @ {self.price}"
+    
+    @property
+    def cost(self):
+        """What the shares still open in this lot cost"""
+        return self.remaining * self.price
+
 class ChartView(TimeStampedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chart_views')
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='chart_views')
     viewed_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-viewed_at']
\ No newline at end of file
+        ordering = ['-viewed_at']
+        indexes = [
+            models.Index(fields=['user', '-viewed_at'], name='chartview_user_viewed_idx'),
+        ]    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The dashboard's recently viewed list is cached on the data version
+        bump_data_version(self.user_id)
@@ -1,5 +1,8 @@
 from celery import shared_task
 from django.core.management import call_command
+from django.core.management.base import OutputWrapper
+import io
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,9 +12,64 @@ def sync_google_sheets():
     """Sync data with Google Sheets"""
     logger.info("Starting Google Sheets sync...")
     try:
-        call_command('sync_google_sheets', direction='both')
+        call_command('sync_google_sheets', direction='both', trigger='celery')
         logger.info("Google Sheets sync completed")
         return "Sync completed successfully"
     except Exception as e:
         logger.error(f"Google Sheets sync failed: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+class JobOutput(io.StringIO):
+    """Per-job output buffer that publishes progress at most once per interval"""
+    
+    def __init__(self, publish, interval=1.0):
+        super().__init__()
+        self.publish = publish
+        self.interval = interval
+        self._last_publish = 0.0
+    
+    def write(self, s):
+        written = super().write(s)
+        now = time.monotonic()
+        if now - self._last_publish >= self.interval:
+            self._last_publish = now
+            try:
+                self.publish()
+            except Exception as e:
+                # Progress is best-effort; never fail the sync over it
+                logger.warning(f"Could not publish job progress: {e}")
+        return written
+    
+    def tail(self, lines=50):
+        return self.getvalue().splitlines()[-lines:]
+
+
+def _job_meta(command, output):
+    return {
+        'progress': getattr(command, 'progress', None),
+        'counts': getattr(command, 'stats', None),
+        'output': output.tail(),
+    }
+
+
+@shared_task(bind=True)
+def run_sheets_sync_job(self, direction='from_sheets'):
+    """Run sync_google_sheets as a tracked job for the webhook.
+    
+    Output goes to a buffer owned by this job; progress, counts and the tail
+    of the output are published through the result backend.
+    """
+    from apps.portfolio.management.commands.sync_google_sheets import Command as SyncCommand
+    
+    command = SyncCommand()
+    output = JobOutput(lambda: self.update_state(state='PROGRESS', meta=_job_meta(command, output)))
+    command.stdout = OutputWrapper(output)
+    command.stderr = OutputWrapper(output)
+    
+    call_command(command, direction=direction, trigger='webhook', task_id=self.request.id or '')
+    
+    meta = _job_meta(command, output)
+    meta['success'] = command.error is None
+    meta['error'] = command.error
+    meta['coalesced'] = command.coalesced
+    return meta
@@ -0,0 +1,39 @@
+from django.test import SimpleTestCase
+from apps.portfolio.management.commands.sync_google_sheets import _merge_requests, _request_payload
+
+
+def request(**options):
+    defaults = {
+        'direction': 'both', 'sheet_id': None, 'import_deposits': False,
+        'batch_size': 500, 'trigger': 'manual', 'task_id': '',
+    }
+    return _request_payload({**defaults, **options})
+
+
+class QueuedSheetsSyncTests(SimpleTestCase):
+    def test_requests_for_one_sheet_share_a_run(self):
+        merged = _merge_requests({
+            request(direction='to_sheets', trigger='cron'),
+            request(direction='from_sheets', import_deposits=True, trigger='webhook', task_id='job-1'),
+        })
+        self.assertEqual(merged, [{
+            'sheet_id': None, 'direction': 'both', 'import_deposits': True,
+            'batch_size': 500, 'trigger': 'webhook', 'task_id': 'job-1',
+        }])
+
+    def test_each_sheet_gets_its_own_run(self):
+        merged = _merge_requests({
+            request(direction='to_sheets'),
+            request(direction='from_sheets', sheet_id='other', trigger='celery', task_id='job-2'),
+        })
+        self.assertEqual(
+            sorted((run['sheet_id'] or '', run['direction'], run['trigger'], run['task_id']) for run in merged),
+            [('', 'to_sheets', 'manual', ''), ('other', 'from_sheets', 'celery', 'job-2')],
+        )
+
+    def test_several_jobs_leave_the_run_without_a_task_id(self):
+        merged = _merge_requests({
+            request(trigger='celery', task_id='job-1'),
+            request(trigger='celery', task_id='job-2'),
+        })
+        self.assertEqual(merged[0]['task_id'], '')
@@ -9,7 +9,7 @@ urlpatterns = [
     path('<int:pk>/', views.PortfolioDetailView.as_view(), name='detail'),
     path('<int:pk>/update/', views.PortfolioUpdateView.as_view(), name='update'),
     path('<int:pk>/add-holding/', views.AddHoldingView.as_view(), name='add_holding'),
-    path('holding/<int:pk>/update/', views.UpdateHoldingView.as_view(), name='update_holding'),
+    path('holding/<int:pk>/trades/', views.HoldingTradesView.as_view(), name='holding_trades'),
     path('holding/<int:pk>/delete/', views.DeleteHoldingView.as_view(), name='delete_holding'),
-    path('chart/<int:stock_id>/', views.StockChartView.as_view(), name='stock_chart'),
+    path('chart/<int:stock_id>/', views.stock_chart, name='stock_chart'),
 ]
\ No newline at end of file
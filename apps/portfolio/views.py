@@ -3,9 +3,15 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.db.models import Count
+from decimal import InvalidOperation
 from .models import Portfolio, Holding
 from apps.core.models import Stock
+from apps.core.utils.async_views import async_login_required
+from apps.core.utils.cache import deferred, fragment_version
+from apps.core.utils.db import read_from_replica
+from apps.core.utils.ledger import realized_gains, record_buy, record_sell
 from decimal import Decimal
 import json
 
@@ -15,7 +21,7 @@ class PortfolioListView(LoginRequiredMixin, ListView):
     context_object_name = 'portfolios'
     
     def get_queryset(self):
-        return Portfolio.objects.filter(user=self.request.user)
+        return Portfolio.objects.filter(user=self.request.user).annotate(holdings_count=Count('holdings'))
 
 class PortfolioDetailView(LoginRequiredMixin, DetailView):
     model = Portfolio
@@ -27,41 +33,49 @@ class PortfolioDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        portfolio = self.get_object()
-        
-        # Update total value
-        portfolio.update_total_value()
-        
-        # Get holdings with calculated values
-        holdings = portfolio.holdings.select_related('stock').all()
-        for holding in holdings:
-            holding.current_value = holding.current_value
-            holding.profit_loss = holding.profit_loss
-            holding.profit_loss_percent = holding.profit_loss_percent
-        
-        context['holdings'] = holdings
-        
-        # Calculate portfolio statistics
-        total_invested = sum(h.quantity * h.average_buy_price for h in holdings)
-        total_current = sum(h.current_value for h in holdings)
-        
-        context['total_invested'] = total_invested
-        context['total_current'] = total_current
-        context['total_profit_loss'] = total_current - total_invested
-        if total_invested:
-            context['total_profit_loss_percent'] = ((total_current - total_invested) / total_invested) * 100
-        else:
-            context['total_profit_loss_percent'] = 0
-        
-        # Chart data for allocation
-        labels = [h.stock.symbol for h in holdings[:10]]
-        data = [float(h.current_value) for h in holdings[:10]]
-        
-        context['chart_labels'] = json.dumps(labels)
-        context['chart_data'] = json.dumps(data)
+        portfolio = self.object
         
+        # The holdings are only loaded if the page fragment is not already cached
+        context['fragment_version'] = fragment_version(self.request.user.id)
+        context.update(deferred(
+            lambda: portfolio_summary(portfolio),
+            'holdings', 'total_invested', 'total_current', 'total_profit_loss',
+            'total_profit_loss_percent', 'chart_labels', 'chart_data',
+        ))
         return context
 
+def portfolio_summary(portfolio):
+    """Holdings of a portfolio with its totals and allocation chart data"""
+    # Get holdings; their values are computed from the joined stock
+    holdings = list(portfolio.holdings.select_related('stock'))
+    
+    # Calculate portfolio statistics
+    total_invested = sum(h.cost_basis for h in holdings)
+    total_current = sum(h.current_value for h in holdings)
+    
+    # Store the total value only when it moved; an update() leaves the
+    # user's data version alone, so the fragment being built stays valid
+    stored_value = Decimal(total_current).quantize(Decimal('0.01'))
+    if portfolio.total_value != stored_value:
+        Portfolio.objects.filter(pk=portfolio.pk).update(total_value=stored_value)
+        portfolio.total_value = stored_value
+    
+    if total_invested:
+        total_profit_loss_percent = ((total_current - total_invested) / total_invested) * 100
+    else:
+        total_profit_loss_percent = 0
+    
+    # Chart data for allocation
+    return {
+        'holdings': holdings,
+        'total_invested': total_invested,
+        'total_current': total_current,
+        'total_profit_loss': total_current - total_invested,
+        'total_profit_loss_percent': total_profit_loss_percent,
+        'chart_labels': json.dumps([h.stock.symbol for h in holdings[:10]]),
+        'chart_data': json.dumps([float(h.current_value) for h in holdings[:10]]),
+    }
+
 class PortfolioCreateView(LoginRequiredMixin, CreateView):
     model = Portfolio
     template_name = 'portfolio/form.html'
@@ -88,33 +102,32 @@ class PortfolioUpdateView(LoginRequiredMixin, UpdateView):
         messages.success(self.request, 'Portfolio updated successfully!')
         return super().form_valid(form)
 
+def parse_trade(request):
+    """Quantity and price posted with a trade, both positive"""
+    try:
+        quantity = Decimal(request.POST.get('quantity', ''))
+        price = Decimal(request.POST.get('price', ''))
+    except InvalidOperation:
+        raise ValueError('Enter a quantity and a price')
+    if quantity <= 0 or price <= 0:
+        raise ValueError('Quantity and price must be above zero')
+    return quantity, price
+
 class AddHoldingView(LoginRequiredMixin, View):
     def post(self, request, pk):
         portfolio = get_object_or_404(Portfolio, pk=pk, user=request.user)
         
         stock_id = request.POST.get('stock_id')
-        quantity = request.POST.get('quantity')
-        price = request.POST.get('price')
         
         try:
             stock = Stock.objects.get(id=stock_id, is_active=True)
+            quantity, price = parse_trade(request)
             
-            # Create or update holding
-            holding, created = Holding.objects.update_or_create(
-                portfolio=portfolio,
-                stock=stock,
-                defaults={
-                    'quantity': Decimal(quantity),
-                    'average_buy_price': Decimal(price)
-                }
-            )
-            
+            # Each add is a buy in the holding's ledger
+            record_buy(portfolio, stock, quantity, price)
             portfolio.update_total_value()
             
-            if created:
-                messages.success(request, f'Added {stock.symbol} to portfolio')
-            else:
-                messages.success(request, f'Updated {stock.symbol} holding')
+            messages.success(request, f'Bought {quantity.normalize():f} {stock.symbol} at ${price:.2f}')
                 
         except Stock.DoesNotExist:
             messages.error(request, 'Stock not found')
@@ -123,47 +136,81 @@ class AddHoldingView(LoginRequiredMixin, View):
         
         return redirect('portfolio:detail', pk=portfolio.pk)
 
-class UpdateHoldingView(LoginRequiredMixin, UpdateView):
+class HoldingTradesView(LoginRequiredMixin, DetailView):
+    """A holding's trades, open lots and realized gains, with a form to buy or sell more"""
     model = Holding
-    template_name = 'portfolio/holding_form.html'
-    fields = ['quantity', 'average_buy_price']
+    template_name = 'portfolio/holding_trades.html'
+    context_object_name = 'holding'
     
     def get_queryset(self):
-        return Holding.objects.filter(portfolio__user=self.request.user)
+        return Holding.objects.filter(portfolio__user=self.request.user).select_related('portfolio', 'stock')
     
-    def get_success_url(self):
-        return reverse_lazy('portfolio:detail', kwargs={'pk': self.object.portfolio.pk})
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        holding = self.object
+        
+        trades = list(holding.trades.order_by('executed_at', 'id'))
+        realized, total_realized = realized_gains(trades)
+        gains = {row['trade'].pk: row for row in realized}
+        for trade in trades:
+            trade.realized = gains.get(trade.pk)
+        
+        context['trades'] = trades[::-1]
+        context['open_lots'] = holding.lots.filter(remaining__gt=0).order_by('acquired_at', 'id')
+        context['total_realized'] = total_realized
+        return context
     
-    def form_valid(self, form):
-        messages.success(self.request, 'Holding updated successfully!')
-        response = super().form_valid(form)
-        self.object.portfolio.update_total_value()
-        return response
+    def post(self, request, pk):
+        holding = get_object_or_404(self.get_queryset(), pk=pk)
+        side = request.POST.get('side')
+        
+        try:
+            quantity, price = parse_trade(request)
+            if side == 'sell':
+                record_sell(holding, quantity, price)
+            else:
+                record_buy(holding.portfolio, holding.stock, quantity, price)
+            holding.portfolio.update_total_value()
+            verb = 'Sold' if side == 'sell' else 'Bought'
+            messages.success(request, f'{verb} {quantity.normalize():f} {holding.stock.symbol} at ${price:.2f}')
+        except Exception as e:
+            messages.error(request, f'Error: {str(e)}')
+        
+        return redirect('portfolio:holding_trades', pk=holding.pk)
 
 class DeleteHoldingView(LoginRequiredMixin, DeleteView):
     model = Holding
     template_name = 'portfolio/holding_confirm_delete.html'
     
     def get_queryset(self):
-        return Holding.objects.filter(portfolio__user=self.request.user)
+        return Holding.objects.filter(portfolio__user=self.request.user).select_related('portfolio__user', 'stock')
     
     def get_success_url(self):
         messages.success(self.request, 'Holding removed from portfolio')
         return reverse_lazy('portfolio:detail', kwargs={'pk': self.object.portfolio.pk})
+    
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        self.object.portfolio.update_total_value()
+        return response
 
-class StockChartView(LoginRequiredMixin, View):
-    def get(self, request, stock_id):
-        stock = get_object_or_404(Stock, id=stock_id)
-        
-        # Mock chart data for the stock
-        import random
-        from datetime import datetime, timedelta
-        
-        dates = [(datetime.now() - timedelta(days=x)).strftime('%Y-%m-%d') for x in range(30, 0, -1)]
-        prices = [float(stock.current_price) * (1 + (random.random() - 0.5) * 0.1) for _ in range(30)]
-        
-        return JsonResponse({
-            'labels': dates,
-            'prices': prices,
-            'symbol': stock.symbol
-        })
\ No newline at end of file
+@async_login_required
+@read_from_replica
+async def stock_chart(request, stock_id):
+    """Chart data for a stock (JSON)"""
+    stock = await Stock.objects.filter(id=stock_id).afirst()
+    if stock is None:
+        raise Http404('Stock not found')
+    
+    # Mock chart data for the stock
+    import random
+    from datetime import datetime, timedelta
+    
+    dates = [(datetime.now() - timedelta(days=x)).strftime('%Y-%m-%d') for x in range(30, 0, -1)]
+    prices = [float(stock.current_price) * (1 + (random.random() - 0.5) * 0.1) for _ in range(30)]
+    
+    return JsonResponse({
+        'labels': dates,
+        'prices': prices,
+        'symbol': stock.symbol
+    })
@@ -24,10 +24,22 @@ app.conf.beat_schedule = {
         'task': 'apps.payments.tasks.generate_pending_invoices',
         'schedule': crontab(minute='*/15'),  # Every 15 minutes
     },
+    'allocate-deposits-every-15-minutes': {
+        'task': 'apps.payments.tasks.allocate_pending_deposits',
+        'schedule': crontab(minute='*/15'),  # Retries allocations that failed at completion
+    },
     'update-stock-prices-daily': {
         'task': 'apps.core.tasks.update_stock_prices',
         'schedule': crontab(minute=0, hour=9),  # 9 AM daily
     },
+    'reconcile-counters-hourly': {
+        'task': 'apps.core.tasks.reconcile_counters',
+        'schedule': crontab(minute=30),  # Every hour, between syncs
+    },
+    'send-unnotified-price-alerts': {
+        'task': 'apps.core.tasks.send_price_alerts',
+        'schedule': crontab(minute='*/15'),  # Catches alerts whose batch was never queued
+    },
 }
 
 @app.task(bind=True, ignore_result=True)
@@ -1,5 +1,7 @@
+import importlib.util
 import os
 from pathlib import Path
+import django
 from decouple import config
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -81,6 +83,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.core.middleware.QueryBudgetMiddleware',
+    'apps.core.middleware.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'inviflow.urls'
@@ -101,24 +105,95 @@ TEMPLATES = [
     },
 ]
 
+# Compile each template once per process in production
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'inviflow.wsgi.application'
 
-# Database - Use SQLite for development
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database - SQLite for development, PostgreSQL when DATABASE_URL is set
+DATABASE_URL = config('DATABASE_URL', default='')
+
+if DATABASE_URL:
+    import dj_database_url
+    
+    # Persistent connections, health-checked before reuse so a database
+    # restart or failover doesn't surface as errors on the next request
+    DATABASES = {
+        'default': dj_database_url.parse(
+            DATABASE_URL,
+            conn_max_age=config('DATABASE_CONN_MAX_AGE', default=600, cast=int),
+            conn_health_checks=True,
+        )
     }
-}
+    
+    # Give up on an unreachable server instead of blocking the request, the
+    # worker or a readiness probe thread on the OS connect timeout
+    DATABASE_CONNECT_TIMEOUT = config('DATABASE_CONNECT_TIMEOUT', default=5, cast=int)
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+        DATABASES['default'].setdefault('OPTIONS', {})['connect_timeout'] = DATABASE_CONNECT_TIMEOUT
+    
+    # Optional psycopg 3 connection pool (Django 5.1+), replacing persistent
+    # connections. Size it per process: web workers need one connection per
+    # serving thread, Celery prefork children one each. Needs
+    # psycopg[binary,pool], which neither requirements file installs.
+    DATABASE_POOL_MAX_SIZE = config('DATABASE_POOL_MAX_SIZE', default=0, cast=int)
+    if DATABASE_POOL_MAX_SIZE and (django.VERSION < (5, 1) or importlib.util.find_spec('psycopg_pool') is None):
+        print(
+            "⚠️ DATABASE_POOL_MAX_SIZE ignored: connection pooling needs Django 5.1+ "
+            "and psycopg[binary,pool]; using persistent connections"
+        )
+    elif DATABASE_POOL_MAX_SIZE:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+            'min_size': config('DATABASE_POOL_MIN_SIZE', default=1, cast=int),
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=int),
+        }
+    
+    # Read replicas (comma-separated URLs) serve views decorated with
+    # read_from_replica; everything else, and every write, uses the primary
+    DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='')
+    for index, replica_url in enumerate(filter(None, map(str.strip, DATABASE_REPLICA_URLS.split(',')))):
+        DATABASES[f'replica_{index}'] = dj_database_url.parse(
+            replica_url,
+            conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+            conn_health_checks=True,
+        )
+        if DATABASES[f'replica_{index}']['ENGINE'] == 'django.db.backends.postgresql':
+            DATABASES[f'replica_{index}'].setdefault('OPTIONS', {})['connect_timeout'] = DATABASE_CONNECT_TIMEOUT
+        DATABASES[f'replica_{index}']['TEST'] = {'MIRROR': 'default'}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Seconds a writer waits for the lock instead of failing
+                # with "database is locked"
+                'timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+            },
+        }
+    }
+    if django.VERSION >= (5, 1):
+        # Take the write lock when a transaction starts, so the busy timeout
+        # applies instead of failing on a read-to-write upgrade
+        DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    # WAL journaling is switched on per connection by apps.core (see
+    # apps/core/utils/db.py) so cron, Celery and web can read while one writes
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS = ['apps.core.utils.db.ReplicaRouter'] if DATABASE_REPLICAS else []
 
-# For production with PostgreSQL (uncomment when needed)
-# import dj_database_url
-# DATABASES = {
-#     'default': dj_database_url.config(
-#         default='sqlite:///' + str(BASE_DIR / 'db.sqlite3'),
-#         conn_max_age=600
-#     )
-# }
+# After a user's POST/PUT/DELETE, their reads stay on the primary this long
+# so they see their own writes despite replica lag
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -164,6 +239,22 @@ GOOGLE_SHEETS_ID = config('GOOGLE_SHEETS_ID', default='')
 # In development: Can use credentials.json file or set the env var
 GOOGLE_SHEETS_CREDENTIALS = config('GOOGLE_SHEETS_CREDENTIALS', default='credentials.json')
 
+# Sheet backend: 'gspread' (live Google Sheets) or 'local' (CSV/XLSX/recorded
+# JSON fixtures under GOOGLE_SHEETS_LOCAL_DIR, for offline runs and benchmarks)
+GOOGLE_SHEETS_BACKEND = config('GOOGLE_SHEETS_BACKEND', default='gspread')
+GOOGLE_SHEETS_LOCAL_DIR = config('GOOGLE_SHEETS_LOCAL_DIR', default=str(BASE_DIR / 'sheets'))
+
+# Sheets API quota: every process shares one token bucket in Redis. Rate-limit
+# errors (HTTP 429) are retried with jittered exponential backoff.
+GOOGLE_SHEETS_REQUESTS_PER_MINUTE = config('GOOGLE_SHEETS_REQUESTS_PER_MINUTE', default=60, cast=int)
+GOOGLE_SHEETS_MAX_RETRIES = config('GOOGLE_SHEETS_MAX_RETRIES', default=5, cast=int)
+GOOGLE_SHEETS_BACKOFF_BASE = config('GOOGLE_SHEETS_BACKOFF_BASE', default=1.0, cast=float)
+GOOGLE_SHEETS_BACKOFF_MAX = config('GOOGLE_SHEETS_BACKOFF_MAX', default=64.0, cast=float)
+
+# Deposits younger than this are left for the next export so that late-committing
+# transactions cannot fall behind the incremental sync cursor
+SHEETS_SYNC_SETTLE_SECONDS = config('SHEETS_SYNC_SETTLE_SECONDS', default=60, cast=int)
+
 # Optional: Log credentials source for debugging (only in development)
 if DEBUG:
     if os.environ.get('GOOGLE_SHEETS_CREDENTIALS'):
@@ -172,12 +263,153 @@ if DEBUG:
         print("📁 Using credentials.json file for Google Sheets (local development)")
 # ==================================================
 
+# Redis - shared by Celery and cross-process coordination (rate limits, locks)
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379')
+
 # Celery (optional) - make these optional with defaults
-CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379')
-CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379')
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TASK_TRACK_STARTED = True
+
+# Sheets syncs and invoice batches run one at a time across cron, Celery beat
+# and the webhook. The lock expires this many seconds after its holder stops
+# heartbeating.
+JOB_LOCK_TTL = config('JOB_LOCK_TTL', default=300, cast=int)
+
+# Live prices - each price sync publishes the changed quotes once on this
+# Redis channel; every ASGI worker holds one subscription and fans it out to
+# its open /api/prices/stream/ connections.
+PRICE_CHANNEL = config('PRICE_CHANNEL', default='inviflow:prices')
+PRICE_STREAM_HEARTBEAT = 15
+
+# Cache - Redis, shared by every worker, unless CACHE_BACKEND=locmem (the
+# DEBUG default, so local development runs without Redis)
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem' if DEBUG else 'redis')
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('CACHE_URL', default=REDIS_URL),
+            'KEY_PREFIX': 'inviflow',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'inviflow',
+        }
+    }
+
+# cached_compute() keeps entries this many seconds past their TTL, serving
+# the stale value while a single worker (holding a lock for at most
+# CACHE_LOCK_TIMEOUT seconds) recomputes it
+CACHE_STALE_GRACE = config('CACHE_STALE_GRACE', default=300, cast=int)
+CACHE_LOCK_TIMEOUT = 30
+HOME_STATS_TTL = 60
+PORTFOLIO_VALUATION_TTL = 30
+
+# Dashboard and portfolio fragments are cached per user and vary on the price
+# epoch (bumped by each price sync) and the user's data version (bumped by
+# portfolio, holding, deposit and chart view writes), so this TTL only bounds
+# memory
+FRAGMENT_CACHE_TTL = config('FRAGMENT_CACHE_TTL', default=3600, cast=int)
+
+# Stock autocomplete - each process keeps its own index of active stocks,
+# rebuilt on the next lookup after a price sync or TYPEAHEAD_MAX_AGE seconds
+TYPEAHEAD_MAX_AGE = 300
+TYPEAHEAD_MAX_RESULTS = 25
+
+# Stock leaderboards (gainers, losers, most active, highest price) - the top
+# LEADERBOARD_SIZE of each are recomputed by every price sync; the TTL only
+# bounds how long stocks added between syncs take to appear
+LEADERBOARD_SIZE = 10
+LEADERBOARDS_TTL = 900
+
+# Price alerts - triggered alerts are claimed and their emails queued this
+# many at a time; each send_price_alerts task sends one batch. Each process
+# rebuilds its alert index when alerts change (seen through the shared
+# cache) or after PRICE_ALERT_INDEX_MAX_AGE seconds
+PRICE_ALERT_BATCH_SIZE = 100
+PRICE_ALERTS_PER_STOCK = 10
+PRICE_ALERT_INDEX_MAX_AGE = 300
+
+# Deposit allocation - completed stock deposits missed at completion time are
+# bought into their holdings by the allocate_deposits sweep this many at a time
+DEPOSIT_ALLOCATION_BATCH_SIZE = 500
+
+# Email (price alert notifications) - printed to the console unless an SMTP
+# backend is configured
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='InviFlow <alerts@inviflow.local>')
+
+# Keyset-paginated lists show the query planner's row estimate instead of
+# running COUNT(*) once it reaches this many rows (PostgreSQL only)
+ESTIMATED_COUNT_THRESHOLD = 1000
+
+# Readiness probe (/api/health/ready/) - each dependency ping is cut off after
+# READINESS_CHECK_TIMEOUT seconds and the report is reused for
+# READINESS_CACHE_SECONDS. Only the READINESS_REQUIRED dependencies failing
+# takes the instance out of rotation; the rest report 'degraded'.
+READINESS_CHECK_TIMEOUT = config('READINESS_CHECK_TIMEOUT', default=1.0, cast=float)
+READINESS_CACHE_SECONDS = config('READINESS_CACHE_SECONDS', default=5, cast=int)
+READINESS_REQUIRED = ['database']
+
+# ========== QUERY BUDGETS ==========
+# Maximum queries per request, keyed by URL name. QueryBudgetMiddleware logs
+# (or, when strict, raises on) overruns and any query shape repeated
+# QUERY_BUDGET_REPEAT_THRESHOLD times; `manage.py check_query_budgets`
+# requests every app URL against fixture data and fails on either.
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=DEBUG, cast=bool)
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+QUERY_BUDGET_REPEAT_THRESHOLD = 3
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGETS = {
+    'core:home': 6,
+    'core:dashboard': 6,
+    'core:profile': 6,
+    'core:stock_list': 4,
+    'core:stock_detail': 7,
+    'core:add_price_alert': 5,
+    'core:delete_price_alert': 4,
+    'payments:deposit_list': 4,
+    'payments:deposit_create': 4,
+    'payments:deposit_detail': 3,
+    'payments:download_invoice': 4,
+    'payments:sync_to_sheets': 2,
+    'payments:invoice_list': 3,
+    'portfolio:list': 3,
+    'portfolio:create': 2,
+    'portfolio:detail': 6,
+    'portfolio:update': 3,
+    'portfolio:add_holding': 2,
+    'portfolio:holding_trades': 5,
+    'portfolio:delete_holding': 3,
+    'portfolio:stock_chart': 3,
+}
+# Form submissions and trades write, so they get budgets of their own
+QUERY_BUDGETS_POST = {
+    'core:profile': 5,
+    'core:add_price_alert': 5,
+    'core:delete_price_alert': 4,
+    'payments:deposit_create': 8,
+    'payments:sync_to_sheets': 2,
+    'portfolio:create': 3,
+    'portfolio:update': 4,
+    'portfolio:add_holding': 11,
+    'portfolio:holding_trades': 10,
+    'portfolio:delete_holding': 10,
+}
+# ==================================================
 
 # ========== PRODUCTION SECURITY SETTINGS ==========
 if not DEBUG:
@@ -42,9 +42,20 @@ urlpatterns = [
     # ========== API ENDPOINTS (FOR RENDER FREE TIER) ==========
     # Webhook for Google Sheets sync (no shell needed)
     path('api/sync-stocks/', core_views.webhook_sync_stocks, name='api_sync_stocks'),
+    path('api/sync-stocks/<str:job_id>/', core_views.webhook_sync_status, name='api_sync_status'),
+    
+    # Stock autocomplete for the deposit and add-holding forms
+    path('api/stocks/typeahead/', core_views.stock_typeahead, name='api_stock_typeahead'),
+    
+    # Live price updates (server-sent events, ASGI only)
+    path('api/prices/stream/', core_views.price_stream, name='api_price_stream'),
     
     # Health check endpoint
     path('api/health/', core_views.health_check, name='api_health'),
+    
+    # Orchestrator probes: liveness does no I/O, readiness pings dependencies
+    path('api/health/live/', core_views.liveness, name='api_health_live'),
+    path('api/health/ready/', core_views.readiness, name='api_health_ready'),
 ]
 
 # Serve media files in development